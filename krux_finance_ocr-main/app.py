@@ -1,16 +1,126 @@
 import os
-import shutil
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import JSONResponse
+import io
+import json
+import time
+import asyncio
+import zipfile
+import multiprocessing
+from typing import List, Optional
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, File, Form, UploadFile, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-from inference import DocumentAI
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+import workers
+import telemetry
+from jobs import JobStore, JobRunner, job_view, check_webhook_url
 
-app = FastAPI(title="KruxOCR API", description="OCR and Document Classification Service for Indian Business Proofs")
+MODEL_PATH = os.getenv("MODEL_PATH", "Krux01/document_ai_model_12class")
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "torch")
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "50")) or None
+PDF_EARLY_STOP_CONF = float(os.getenv("PDF_EARLY_STOP_CONF", "0.9"))
+PDF_SPILL_MB = float(os.getenv("PDF_SPILL_MB", "8"))
+OCR_MAX_SIDE = int(os.getenv("OCR_MAX_SIDE", "2200"))
+OCR_ENGINE = os.getenv("OCR_ENGINE", "auto")
+OCR_POOL_SIZE = int(os.getenv("OCR_POOL_SIZE", "0")) or None
+OCR_HEADER_FRACTION = float(os.getenv("OCR_HEADER_FRACTION", str(1 / 3)))
+TEXT_CLF_THRESHOLD = float(os.getenv("TEXT_CLF_THRESHOLD", "0.95"))
+TORCH_PRECISION = os.getenv("TORCH_PRECISION", "fp32")
+TORCH_COMPILE = os.getenv("TORCH_COMPILE", "0").lower() in ("1", "true", "yes")
+TORCH_THREADS = int(os.getenv("TORCH_THREADS", "0")) or None
+TORCH_INTEROP_THREADS = int(os.getenv("TORCH_INTEROP_THREADS", "1"))
+DYNAMIC_PADDING = os.getenv("DYNAMIC_PADDING", "1").lower() in ("1", "true", "yes")
+WINDOW_STRIDE = int(os.getenv("WINDOW_STRIDE", "128"))
+# uvicorn reads its --workers default from WEB_CONCURRENCY; each server process runs its own models
+SERVER_WORKERS = int(os.getenv("WEB_CONCURRENCY", "1"))
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "10"))
+CACHE_SIZE = int(os.getenv("CACHE_SIZE", "1024"))
+CACHE_DIR = os.getenv("CACHE_DIR") or None
+CACHE_DISK_MAX_MB = float(os.getenv("CACHE_DISK_MAX_MB", "512"))
+CACHE_TTL_S = float(os.getenv("CACHE_TTL_S", "0")) or None
+WORKER_POOL = os.getenv("WORKER_POOL", "thread")
+WORKER_POOL_SIZE = int(os.getenv("WORKER_POOL_SIZE", "0")) or None
+WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE")) if os.getenv("WORKER_QUEUE_SIZE") else None
+# Limits on the zip archives of one /analyze/batch request, checked before any member is decompressed
+ZIP_MAX_MEMBERS = int(os.getenv("ZIP_MAX_MEMBERS", "1000"))
+ZIP_MAX_UNCOMPRESSED_MB = float(os.getenv("ZIP_MAX_UNCOMPRESSED_MB", "512"))
+JOBS_DIR = os.getenv("JOBS_DIR", "./jobs")
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "0")) or None
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Hosts webhooks may be sent to; when unset, any host resolving only to public addresses
+JOB_WEBHOOK_HOSTS = tuple(h.strip().lower() for h in os.getenv("JOB_WEBHOOK_HOSTS", "").split(",") if h.strip())
+JOB_LEASE_S = float(os.getenv("JOB_LEASE_S", "60"))
+JOB_RETENTION_S = float(os.getenv("JOB_RETENTION_S", str(7 * 24 * 3600)))
 
-# Initialize Pipeline (Load model once at startup)
-# Note: In a real deployment, you might want to load this lazily or handle model download if not present.
-# For this setup, we assume the model is either present or will fallback to base model.
-pipeline = DocumentAI(model_path=os.getenv("MODEL_PATH", "Krux01/document_ai_model_12class"))
+# Workers × threads topology: thread pools share one model per server process, process pools run
+# one per worker process. Unless TORCH_THREADS is set, the CPUs are split evenly between the models
+# so concurrent forward passes don't oversubscribe the cores.
+MODEL_PROCESSES = SERVER_WORKERS * ((WORKER_POOL_SIZE or os.cpu_count() or 1) if WORKER_POOL == "process" else 1)
+TORCH_THREADS = TORCH_THREADS or workers.threads_per_process(MODEL_PROCESSES)
+
+PIPELINE_OPTIONS = dict(
+    model_path=MODEL_PATH, backend=MODEL_BACKEND,
+    pdf_max_pages=PDF_MAX_PAGES, early_stop_conf=PDF_EARLY_STOP_CONF, pdf_spill_mb=PDF_SPILL_MB,
+    max_image_side=OCR_MAX_SIDE, header_fraction=OCR_HEADER_FRACTION, text_clf_threshold=TEXT_CLF_THRESHOLD,
+    ocr_engine=OCR_ENGINE, ocr_pool_size=OCR_POOL_SIZE or WORKER_POOL_SIZE,
+    precision=TORCH_PRECISION, compile_model=TORCH_COMPILE, torch_threads=TORCH_THREADS, torch_interop_threads=TORCH_INTEROP_THREADS,
+    dynamic_padding=DYNAMIC_PADDING, window_stride=WINDOW_STRIDE,
+    batch_max_size=BATCH_MAX_SIZE, batch_max_wait_ms=BATCH_MAX_WAIT_MS,
+    cache_size=CACHE_SIZE, cache_dir=CACHE_DIR, cache_disk_max_mb=CACHE_DISK_MAX_MB, cache_ttl_s=CACHE_TTL_S,
+)
+
+# Blocking OCR and model work runs on a bounded pool so the event loop stays responsive.
+# Thread pools share one pipeline (micro-batcher, cache); process pools build one per worker.
+# Models are loaded in the background after startup (see lifespan); until then documents the
+# rules can classify are served and the rest get a 503.
+if WORKER_POOL == "process":
+    pipeline = None
+    models_ready = multiprocessing.get_context("spawn").Value("i", 0)
+    models_failed = multiprocessing.get_context("spawn").Value("i", 0)
+    pool = workers.WorkerPool("process", WORKER_POOL_SIZE, WORKER_QUEUE_SIZE,
+                              initializer=workers.init_process, initargs=(PIPELINE_OPTIONS, models_ready, models_failed))
+else:
+    pipeline = workers.build_pipeline(**PIPELINE_OPTIONS, lazy=True)
+    workers.set_pipeline(pipeline)
+    pool = workers.WorkerPool("thread", WORKER_POOL_SIZE, WORKER_QUEUE_SIZE)
+
+def model_state():
+    """"ready", "loading", or "failed" once any worker's model failed to load (loading is not retried)."""
+    if pipeline:
+        if pipeline.load_error is not None: return "failed"
+        return "ready" if pipeline.model_ready.is_set() else "loading"
+    if models_failed.value: return "failed"
+    return "ready" if models_ready.value >= pool.size else "loading"
+
+async def _analyze_job(data, filename):
+    start = time.perf_counter()
+    with telemetry.IN_FLIGHT.labels("jobs").track_inprogress():
+        result, timings = await pool.run(workers.analyze_upload, data, filename)
+    _observe("jobs", result, timings, start)
+    return result
+
+# Asynchronous jobs (POST /jobs) are persisted in SQLite and fed to the same worker pool. By default
+# they may occupy at most half of the workers, so synchronous /analyze traffic is never starved.
+job_store = JobStore(JOBS_DIR, max_attempts=JOB_MAX_ATTEMPTS, lease_s=JOB_LEASE_S)
+job_runner = JobRunner(job_store, _analyze_job, concurrency=JOB_CONCURRENCY or max(1, pool.size // 2),
+                       busy_errors=(workers.PoolFull, workers.ModelNotReady), fatal_errors=(workers.ModelLoadFailed,),
+                       ready=lambda: model_state() != "loading", webhook_hosts=JOB_WEBHOOK_HOSTS)
+
+@asynccontextmanager
+async def lifespan(app):
+    if pipeline: workers.start_loading(pipeline)
+    else: pool.start()
+    job_store.purge(JOB_RETENTION_S)
+    dispatcher = asyncio.ensure_future(job_runner.run_forever())
+    yield
+    # Jobs still running are requeued by the next process (JobStore.recover)
+    dispatcher.cancel()
+    await job_runner.stop()
+    pool.shutdown(wait=False)
+    telemetry.mark_process_dead()
+
+app = FastAPI(title="KruxOCR API", description="OCR and Document Classification Service for Indian Business Proofs", lifespan=lifespan)
 
 origins_env = os.getenv("CORS_ORIGINS", "*")
 origins = [o.strip() for o in origins_env.split(",")] if origins_env else ["*"]
@@ -26,42 +136,198 @@ app.add_middleware(
 def health_check():
     return {"status": "healthy", "service": "KruxOCR"}
 
+@app.get("/livez")
+def livez():
+    """Liveness: the process is up and serving requests."""
+    return {"status": "alive"}
+
+@app.get("/readyz")
+def readyz():
+    """Readiness: the classifier is loaded and warmed up (in every worker process)."""
+    state = model_state()
+    if state == "failed":
+        return JSONResponse(status_code=503, content={"status": "failed"})
+    if state == "loading":
+        return JSONResponse(status_code=503, content={"status": "loading"}, headers={"Retry-After": "5"})
+    return {"status": "ready", "model": pipeline.loaded_model if pipeline else MODEL_PATH}
+
+def _ocr_engine_stats():
+    from ocr import engine_stats
+    return engine_stats()
+
+@app.get("/stats")
+def stats():
+    return {
+        "workers": pool.stats(),
+        "batching": pipeline.batcher.stats() if pipeline and pipeline.batcher else None,
+        "cache": pipeline.cache.stats() if pipeline and pipeline.cache else None,
+        "ocr_paths": dict(pipeline.ocr_paths) if pipeline else None,
+        "ocr_engines": _ocr_engine_stats() if pipeline else None,
+        "topology": {"server_workers": SERVER_WORKERS, "model_processes": MODEL_PROCESSES, "torch_threads": TORCH_THREADS,
+                     "precision": TORCH_PRECISION, "compile": TORCH_COMPILE},
+        "jobs": job_store.stats(),
+    }
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus metrics: per-stage latency histograms, document outcomes and in-flight gauge."""
+    return Response(generate_latest(telemetry.registry()), media_type=CONTENT_TYPE_LATEST)
+
+def _observe(endpoint, result, timings, start, upload_s=None):
+    # "queue" is whatever the worker didn't account for: waiting for a free worker plus IPC
+    elapsed = time.perf_counter() - start
+    timings = {"queue": max(0.0, elapsed - (upload_s or 0.0) - timings.get("pipeline", 0.0)), **timings}
+    if upload_s is not None: timings["upload"] = upload_s
+    telemetry.observe(endpoint, result, timings, elapsed)
+    return {**timings, "total": elapsed}
+
 @app.post("/analyze")
-async def analyze_document(file: UploadFile = File(...)):
+async def analyze_document(request: Request, file: UploadFile = File(...)):
     """
     Upload a document image (JPG, PNG) or PDF to get OCR extraction results.
+    Send `X-Debug-Timings: 1` to get per-stage timings (ms) in the response.
     """
-    try:
-        # Save uploaded file temporarily
-        temp_filename = f"temp_{file.filename}"
-        with open(temp_filename, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Run Inference
+    start = time.perf_counter()
+    with telemetry.IN_FLIGHT.labels("analyze").track_inprogress():
         try:
-            # Handle PDF conversion if needed (basic check, inference.py handles logic if implemented, 
-            # but for now inference.py expects image path. 
-            # If inference.py handles PDF via pdf2image internally, we are good.
-            # Looking at inference.py, it uses Image.open(), so we should ensure it's an image.
-            # If it's a PDF, we might need to convert it here or ensure inference.py handles it.
-            # The original script had PDF conversion in the test block. 
-            # Let's add basic PDF handling here if needed, or rely on the user sending images.
-            # For robustness, let's assume the user sends images for now as per PRD P0.
-            
-            result = pipeline.analyze(temp_filename)
-            
-            # Cleanup
-            os.remove(temp_filename)
-            
-            return JSONResponse(content=result)
-            
+            data = await file.read()
         except Exception as e:
-            if os.path.exists(temp_filename):
-                os.remove(temp_filename)
+            raise HTTPException(status_code=500, detail=f"Upload Error: {str(e)}")
+        upload_s = time.perf_counter() - start
+
+        try:
+            result, timings = await pool.run(workers.analyze_upload, data, file.filename)
+        except workers.PoolFull as e:
+            raise HTTPException(status_code=503, detail=f"Server busy: {str(e)}", headers={"Retry-After": "1"})
+        except workers.ModelNotReady as e:
+            raise HTTPException(status_code=503, detail=f"Model loading: {str(e)}", headers={"Retry-After": "5"})
+        except Exception as e:
+            _observe("analyze", {"Error": str(e)}, {}, start, upload_s)
             raise HTTPException(status_code=500, detail=f"Processing Error: {str(e)}")
 
+    timings = _observe("analyze", result, timings, start, upload_s)
+    if request.headers.get("X-Debug-Timings", "").lower() in ("1", "true", "yes"):
+        result = {**result, "Timings": telemetry.as_ms(timings)}
+    return JSONResponse(content=result)
+
+@app.post("/jobs", status_code=202)
+async def submit_job(file: UploadFile = File(...), webhook_url: Optional[str] = Form(None)):
+    """
+    Queue a document for asynchronous analysis and return its job id immediately. Poll
+    `GET /jobs/{id}` for the result, or pass `webhook_url` to have it POSTed when the job finishes.
+    """
+    if webhook_url:
+        try:
+            await asyncio.to_thread(check_webhook_url, webhook_url, JOB_WEBHOOK_HOSTS)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    try:
+        data = await file.read()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Upload Error: {str(e)}")
+    job_id = await asyncio.to_thread(job_store.submit, data, file.filename, webhook_url)
+    job_runner.notify()
+    return {"id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}"}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await asyncio.to_thread(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_view(job)
+
+def _zip_members(zf):
+    return [info for info in zf.infolist() if not info.is_dir() and not info.filename.startswith("__MACOSX/")]
+
+def _check_zip_limits(uploads):
+    """Raises a 400 when the request's zip archives hold too many members or too much uncompressed data."""
+    members, size = 0, 0
+    for name, data in uploads:
+        if not zipfile.is_zipfile(io.BytesIO(data)): continue
+        try:
+            with zipfile.ZipFile(io.BytesIO(data)) as zf:
+                infos = _zip_members(zf)
+        except zipfile.BadZipFile as e:
+            raise HTTPException(status_code=400, detail=f"Invalid zip archive: {name} ({e})")
+        # file_size is the declared size; reads of a member stop there, so it bounds memory use
+        members += len(infos)
+        size += sum(info.file_size for info in infos)
+    if members > ZIP_MAX_MEMBERS:
+        raise HTTPException(status_code=400, detail=f"Zip archives hold {members} files (limit {ZIP_MAX_MEMBERS})")
+    if size > ZIP_MAX_UNCOMPRESSED_MB * 1024 * 1024:
+        raise HTTPException(status_code=400, detail=f"Zip archives expand to {size / 1024 / 1024:.0f} MB (limit {ZIP_MAX_UNCOMPRESSED_MB:.0f} MB)")
+
+def _expand_uploads(uploads):
+    """
+    Yields (name, bytes, error) for each uploaded document, unpacking zip archives into their members.
+    Members that can't be extracted (corrupt, encrypted, unsupported compression) come with an error instead.
+    """
+    for name, data in uploads:
+        if zipfile.is_zipfile(io.BytesIO(data)):
+            with zipfile.ZipFile(io.BytesIO(data)) as zf:
+                for info in _zip_members(zf):
+                    try:
+                        member = zf.read(info)
+                    except Exception as e:
+                        yield f"{name}/{info.filename}", None, f"Invalid zip member: {str(e)}"
+                        continue
+                    yield f"{name}/{info.filename}", member, None
+        else:
+            yield name, data, None
+
+async def _analyze_batch_item(name, data):
+    start = time.perf_counter()
+    with telemetry.IN_FLIGHT.labels("batch").track_inprogress():
+        # Batch items wait for a free slot (or the model) instead of being rejected
+        while True:
+            try:
+                result, timings = await pool.run(workers.analyze_upload, data, name)
+                break
+            except workers.PoolFull:
+                await asyncio.sleep(0.05)
+            except workers.ModelNotReady:
+                # Resubmitting repeats the OCR, so wait until loading has finished (or failed) first
+                while model_state() == "loading": await asyncio.sleep(0.5)
+                if model_state() == "failed":
+                    result, timings = {"Error": "Processing Error: The classifier failed to load"}, {}
+                    break
+            except Exception as e:
+                result, timings = {"Error": f"Processing Error: {str(e)}"}, {}
+                break
+    _observe("batch", result, timings, start)
+    return {"file": name, **result}
+
+@app.post("/analyze/batch")
+async def analyze_batch(files: List[UploadFile] = File(...)):
+    """
+    Upload several documents (or zip archives of documents) and stream one JSON result per line
+    (NDJSON) as each document finishes.
+    """
+    try:
+        uploads = [(f.filename, await f.read()) for f in files]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Upload Error: {str(e)}")
+    for name, data in uploads:
+        if name.lower().endswith(".zip") and not zipfile.is_zipfile(io.BytesIO(data)):
+            raise HTTPException(status_code=400, detail=f"Invalid zip archive: {name}")
+    _check_zip_limits(uploads)
+
+    async def stream():
+        pending = set()
+        for name, data, error in _expand_uploads(uploads):
+            if error:
+                yield json.dumps({"file": name, "Error": error}) + "\n"
+                continue
+            # At most one document per worker in flight per batch, so batches don't starve /analyze
+            if len(pending) >= pool.size:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done: yield json.dumps(task.result()) + "\n"
+            pending.add(asyncio.ensure_future(_analyze_batch_item(name, data)))
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done: yield json.dumps(task.result()) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
 
 if __name__ == "__main__":
     import uvicorn
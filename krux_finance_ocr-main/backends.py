@@ -0,0 +1,122 @@
+import os
+import torch
+from functools import lru_cache
+
+INPUT_NAMES = ["input_ids", "bbox", "attention_mask", "pixel_values"]
+ONNX_FILES = {"onnx": "model.onnx", "onnx-int8": "model.int8.onnx"}
+PRECISIONS = ("fp32", "bf16", "auto")
+
+@lru_cache(maxsize=None)
+def cpu_supports_bf16():
+    """True when /proc/cpuinfo lists native bf16 instructions (AVX512-BF16 or AMX on x86, BF16 on Arm)."""
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = set(f.read().split())
+    except OSError:
+        return False
+    return bool(flags & {"avx512_bf16", "amx_bf16", "bf16"})
+
+def resolve_precision(precision, device):
+    """Maps `auto` to bf16 where the hardware runs it natively and fp32 elsewhere."""
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision: {precision} (expected one of {', '.join(PRECISIONS)})")
+    if precision != "auto": return precision
+    native = torch.cuda.is_bf16_supported() if device.type == "cuda" else cpu_supports_bf16()
+    return "bf16" if native else "fp32"
+
+def configure_threads(intra_op=None, inter_op=None):
+    """
+    Sets this process's torch intra-op (per-operator) and inter-op thread pools. The inter-op pool can
+    only be sized before torch first uses it, so a late call leaves it unchanged.
+    """
+    if intra_op: torch.set_num_threads(intra_op)
+    if inter_op and inter_op != torch.get_num_interop_threads():
+        try:
+            torch.set_num_interop_threads(inter_op)
+        except RuntimeError:
+            print(f"⚠️ torch inter-op threads already in use; keeping {torch.get_num_interop_threads()}.")
+
+class TorchBackend:
+    """
+    PyTorch LayoutLMv3 classifier run under inference_mode, optionally with bf16 autocast and
+    torch.compile. The model is compiled lazily, on the first (warm-up) forward pass; if compilation
+    fails the eager model is used instead.
+    """
+    def __init__(self, model, device, precision="fp32", compile=False):
+        self.model = model
+        self.device = device
+        self.precision = precision
+        self.name = "torch" if precision == "fp32" else f"torch-{precision}"
+        self._forward = torch.compile(model) if compile else model
+
+    def predict(self, inputs):
+        """Maps a dict of (batch, ...) input tensors to CPU fp32 logits of shape (batch, num_labels)."""
+        inputs = {k: v.to(self.device) for k, v in inputs.items()}
+        with torch.inference_mode(), torch.autocast(self.device.type, dtype=torch.bfloat16, enabled=self.precision == "bf16"):
+            try:
+                logits = self._forward(**inputs).logits
+            except Exception as e:
+                if self._forward is self.model: raise
+                print(f"⚠️ torch.compile failed, using the eager model: {e}")
+                self._forward = self.model
+                logits = self.model(**inputs).logits
+        return logits.float().cpu()
+
+class OnnxBackend:
+    """ONNX Runtime session over a graph exported by `export_onnx` (fp32 or dynamically quantized int8)."""
+    def __init__(self, onnx_path, intra_op_threads=0):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = intra_op_threads
+        self.name = os.path.basename(onnx_path)
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def predict(self, inputs):
+        feeds = {k: v.cpu().numpy() for k, v in inputs.items() if k in self.input_names}
+        return torch.from_numpy(self.session.run(["logits"], feeds)[0])
+
+def onnx_path(model_dir, backend):
+    if backend not in ONNX_FILES:
+        raise ValueError(f"Unknown ONNX backend: {backend} (expected one of {', '.join(ONNX_FILES)})")
+    return os.path.join(model_dir, ONNX_FILES[backend])
+
+class _ExportWrapper(torch.nn.Module):
+    # Fixes the positional input order of the exported graph to INPUT_NAMES
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, bbox, attention_mask, pixel_values):
+        return self.model(input_ids=input_ids, bbox=bbox, attention_mask=attention_mask, pixel_values=pixel_values).logits
+
+def export_onnx(model, output_path, seq_len=512, opset=17):
+    """Exports a LayoutLMv3ForSequenceClassification with dynamic batch and sequence axes."""
+    wrapper = _ExportWrapper(model.cpu()).eval()
+    dummy = (
+        torch.ones(1, seq_len, dtype=torch.long),
+        torch.zeros(1, seq_len, 4, dtype=torch.long),
+        torch.ones(1, seq_len, dtype=torch.long),
+        torch.zeros(1, 3, 224, 224),
+    )
+    dynamic_axes = {
+        "input_ids": {0: "batch", 1: "sequence"},
+        "bbox": {0: "batch", 1: "sequence"},
+        "attention_mask": {0: "batch", 1: "sequence"},
+        "pixel_values": {0: "batch"},
+        "logits": {0: "batch"},
+    }
+    kwargs = {}
+    if "dynamo" in torch.onnx.export.__code__.co_varnames:
+        kwargs["dynamo"] = False  # the TorchScript exporter handles LayoutLMv3's dynamic axes reliably
+    with torch.no_grad():
+        torch.onnx.export(wrapper, dummy, output_path, input_names=INPUT_NAMES, output_names=["logits"],
+                          dynamic_axes=dynamic_axes, opset_version=opset, **kwargs)
+    return output_path
+
+def quantize_onnx(input_path, output_path):
+    """Dynamic int8 quantization of the exported graph's MatMul/Gemm weights."""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    quantize_dynamic(input_path, output_path, weight_type=QuantType.QInt8)
+    return output_path
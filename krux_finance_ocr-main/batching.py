@@ -0,0 +1,79 @@
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from queue import Queue, Empty
+
+class MicroBatcher:
+    """
+    Coalesces model-fallback documents from concurrent requests into one padded forward pass.
+    Callers block on `submit(enc)`; a single scheduler thread drains the queue until either
+    `max_batch_size` documents are pending or the oldest one has waited `max_wait_ms`.
+    """
+    def __init__(self, predict_fn, max_batch_size=8, max_wait_ms=10):
+        self.predict_fn = predict_fn  # list of encodings -> list of logits (one per encoding)
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = Queue()
+        self._lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._docs = 0
+        self._batches = 0
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, enc):
+        """Queues one encoded document and blocks until its logits are available."""
+        fut = Future()
+        self._queue.put((enc, time.perf_counter(), fut))
+        return fut.result()
+
+    def _collect(self):
+        first = self._queue.get()
+        batch = [first]
+        deadline = first[1] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            # Documents that queued up during the previous forward pass are taken without waiting
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            start = time.perf_counter()
+            try:
+                outputs = self.predict_fn([enc for enc, _, _ in batch])
+                for (_, _, fut), out in zip(batch, outputs):
+                    fut.set_result(out)
+            except Exception as e:
+                for _, _, fut in batch:
+                    if not fut.done(): fut.set_exception(e)
+            self._record(len(batch), [start - t for _, t, _ in batch])
+
+    def _record(self, size, waits):
+        with self._lock:
+            self._batch_sizes[size] += 1
+            self._batches += 1
+            self._docs += size
+            self._wait_total += sum(waits)
+            self._wait_max = max(self._wait_max, max(waits))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "batches": self._batches,
+                "documents": self._docs,
+                "avg_batch_size": round(self._docs / self._batches, 3) if self._batches else 0.0,
+                "batch_size_histogram": {str(k): v for k, v in sorted(self._batch_sizes.items())},
+                "queue_wait_ms_avg": round(self._wait_total / self._docs * 1000, 3) if self._docs else 0.0,
+                "queue_wait_ms_max": round(self._wait_max * 1000, 3),
+                "pending": self._queue.qsize(),
+            }
@@ -0,0 +1,155 @@
+"""
+Latency, throughput, memory and parity benchmark for the classifier backends (torch, onnx,
+onnx-int8) and the torch fast-path variants (`torch+bf16`, `torch+compile`, `torch+bf16+compile`).
+Appending `+pad512` to any backend pads every page to 512 tokens instead of its length bucket.
+
+Synthetic pages are OCR'd once; each backend then runs in its own spawned processes so that peak
+RSS reflects that backend alone. Every backend is run under each `--topologies` entry WxT: W
+processes with T intra-op threads each, sharing the pages and starting together, as uvicorn or
+process-pool workers would on one node. Predictions are compared with the first torch run and the
+run fails (exit code 1) when agreement drops below --min-agreement.
+
+    python export_onnx.py --model ./saved_12class_model --quantize
+    python -m benchmarks.bench_backends --model ./saved_12class_model --pages-per-class 5
+    python -m benchmarks.bench_backends --backends torch,torch+bf16,torch+compile --topologies 1x8,2x4,4x2,8x1
+    python -m benchmarks.bench_backends --backends torch,torch+pad512,onnx,onnx+pad512
+"""
+import sys
+import json
+import time
+import pickle
+import argparse
+import resource
+import tempfile
+import multiprocessing
+import numpy as np
+import workers
+from ocr import get_ocr
+from benchmarks.corpus import render_pages
+
+def parse_backend(spec):
+    """'torch+bf16+compile' -> DocumentAI options."""
+    backend, *flags = spec.split("+")
+    unknown = set(flags) - {"bf16", "compile", "pad512"}
+    if unknown or (set(flags) & {"bf16", "compile"} and backend != "torch"):
+        raise ValueError(f"Unknown backend variant: {spec}")
+    return {"backend": backend, "precision": "bf16" if "bf16" in flags else "fp32", "compile_model": "compile" in flags,
+            "dynamic_padding": "pad512" not in flags}
+
+def parse_topology(spec):
+    processes, threads = spec.lower().split("x")
+    return int(processes), int(threads)
+
+def run_backend(model_dir, spec, corpus_path, warmup, threads, rank, processes, barrier):
+    from backends import configure_threads
+    from inference import DocumentAI
+    configure_threads(threads, 1)
+    with open(corpus_path, "rb") as f:
+        corpus = pickle.load(f)
+    pipeline = DocumentAI(model_path=model_dir, threads=threads, **parse_backend(spec))
+    encs = [pipeline._encode(img, words, boxes) for _, img, words, boxes in corpus]
+    for enc in encs[:warmup]:
+        pipeline._predict_batch([enc])
+
+    # Every process takes its share of the pages once all of them are warm
+    barrier.wait()
+    start = time.time()
+    latencies, predictions = [], {}
+    for i in range(rank, len(encs), processes):
+        t = time.perf_counter()
+        logits = pipeline._predict_batch([encs[i]])[0]
+        latencies.append((time.perf_counter() - t) * 1000)
+        predictions[i] = pipeline.id2label[logits.argmax(-1).item()]
+    return {
+        "latencies_ms": latencies,
+        "predictions": predictions,
+        "start": start,
+        "end": time.time(),
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+def run_topology(ctx, model_dir, spec, corpus_path, warmup, processes, threads):
+    with ctx.Manager() as manager, ctx.Pool(processes) as pool:
+        barrier = manager.Barrier(processes)
+        outs = pool.starmap(run_backend, [(model_dir, spec, corpus_path, warmup, threads, rank, processes, barrier)
+                                          for rank in range(processes)])
+    predictions = {}
+    for out in outs: predictions.update(out["predictions"])
+    return {
+        "latencies_ms": [l for out in outs for l in out["latencies_ms"]],
+        "predictions": [predictions[i] for i in sorted(predictions)],
+        "wall_s": max(out["end"] for out in outs) - min(out["start"] for out in outs),
+        "peak_rss_mb": max(out["peak_rss_mb"] for out in outs),
+    }
+
+def summarize(backend, topology, out, labels, reference):
+    lat = np.array(out["latencies_ms"])
+    preds = out["predictions"]
+    return {
+        "backend": backend,
+        "topology": topology,
+        "p50_ms": round(float(np.percentile(lat, 50)), 2),
+        "p95_ms": round(float(np.percentile(lat, 95)), 2),
+        "docs_per_sec": round(len(preds) / out["wall_s"], 2),
+        "peak_rss_mb": round(out["peak_rss_mb"], 1),
+        "accuracy": round(float(np.mean([p == l for p, l in zip(preds, labels)])), 4),
+        "agreement_with_torch": round(float(np.mean([p == r for p, r in zip(preds, reference)])), 4) if reference else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Classifier backend benchmark and parity check")
+    parser.add_argument("--model", default="./saved_12class_model", help="Model directory containing the exported ONNX graphs")
+    parser.add_argument("--backends", default="torch,onnx,onnx-int8", help="Also torch+bf16, torch+compile, torch+bf16+compile; +pad512 on any backend")
+    parser.add_argument("--topologies", default=f"1x{workers.available_cpus()}",
+                        help="Comma-separated PROCESSESxTHREADS, e.g. 1x8,2x4,4x2")
+    parser.add_argument("--pages-per-class", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-agreement", type=float, default=0.98, help="Required prediction agreement with torch")
+    parser.add_argument("--output", help="Write the summary as JSON")
+    args = parser.parse_args()
+
+    print("🚀 Rendering and OCR'ing synthetic pages...")
+    corpus = [(label, img, *get_ocr(img)) for label, img in render_pages(args.pages_per_class, args.seed)]
+    labels = [c[0] for c in corpus]
+
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    topologies = [t.strip() for t in args.topologies.split(",") if t.strip()]
+    try:
+        for b in backends: parse_backend(b)
+        for t in topologies: parse_topology(t)
+    except ValueError as e:
+        parser.error(str(e))
+    if "torch" in backends: backends.remove("torch"); backends.insert(0, "torch")
+    ctx = multiprocessing.get_context("spawn")
+    rows, reference = [], None
+    with tempfile.NamedTemporaryFile(suffix=".pkl") as f:
+        pickle.dump(corpus, f)
+        f.flush()
+        for backend in backends:
+            for topology in topologies:
+                processes, threads = parse_topology(topology)
+                print(f"⏱️ Benchmarking {backend} with {processes} process(es) x {threads} thread(s)...")
+                out = run_topology(ctx, args.model, backend, f.name, args.warmup, processes, threads)
+                if backend == "torch" and reference is None: reference = out["predictions"]
+                rows.append(summarize(backend, topology, out, labels, reference))
+
+    print("\n" + "="*98)
+    print(f"{'backend':<20}{'topology':>10}{'p50 ms':>10}{'p95 ms':>10}{'docs/s':>10}{'RSS MB':>10}{'accuracy':>12}{'agreement':>12}")
+    for r in rows:
+        agreement = "-" if r["agreement_with_torch"] is None else f"{r['agreement_with_torch']:.2%}"
+        print(f"{r['backend']:<20}{r['topology']:>10}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['docs_per_sec']:>10}"
+              f"{r['peak_rss_mb']:>10}{r['accuracy']:>12.2%}{agreement:>12}")
+    print("="*98)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"pages": len(corpus), "backends": rows}, f, indent=2)
+
+    failed = [f"{r['backend']} ({r['topology']})" for r in rows if r["agreement_with_torch"] is not None and r["agreement_with_torch"] < args.min_agreement]
+    if failed:
+        print(f"❌ Parity check failed for: {', '.join(failed)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
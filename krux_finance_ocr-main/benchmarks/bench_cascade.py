@@ -0,0 +1,102 @@
+"""
+Tier usage, per-tier accuracy and CPU cost of the rules -> text classifier -> LayoutLMv3 cascade.
+
+Held-out pages are rendered with a seed the training set did not use and OCR'd once. Both
+classifiers are run on every page the rules leave unclassified, so each threshold in the sweep is
+evaluated exactly: pages at or above the threshold are answered by the text tier, the rest
+escalate to LayoutLMv3. Cost is the measured classification time per document (OCR excluded,
+since every tier shares it).
+
+    python train.py   # writes text_clf.joblib next to the model
+    python -m benchmarks.bench_cascade --model ./saved_12class_model --pages-per-class 20
+"""
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from ocr import get_ocr
+from rules import RULE_ENGINE
+from preprocess import normalize_image
+from benchmarks.corpus import render_pages
+
+def sweep(labels, rule_preds, text_preds, text_probs, text_ms, model_preds, model_ms, threshold):
+    n = len(labels)
+    tiers = {"rules": [], "text": [], "model": []}
+    cost_ms = 0.0
+    for i in range(n):
+        if rule_preds[i]:
+            tiers["rules"].append(rule_preds[i] == labels[i])
+            continue
+        cost_ms += text_ms[i]
+        if text_probs[i] >= threshold:
+            tiers["text"].append(text_preds[i] == labels[i])
+        else:
+            cost_ms += model_ms[i]
+            tiers["model"].append(model_preds[i] == labels[i])
+    return {
+        "threshold": threshold,
+        "share": {t: round(len(v) / n, 4) for t, v in tiers.items()},
+        "accuracy": {t: round(float(np.mean(v)), 4) if v else None for t, v in tiers.items()},
+        "overall_accuracy": round(sum(sum(v) for v in tiers.values()) / n, 4),
+        "classify_ms_per_doc": round(cost_ms / n, 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Confidence-gated cascade benchmark")
+    parser.add_argument("--model", default="./saved_12class_model", help="Local model directory containing text_clf.joblib")
+    parser.add_argument("--backend", default="torch")
+    parser.add_argument("--pages-per-class", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1234, help="Use a seed other than the training set's")
+    parser.add_argument("--thresholds", default="0.5,0.7,0.8,0.9,0.95,0.99")
+    parser.add_argument("--skip-rules", action="store_true", help="Send every page through the classifiers (more samples per tier)")
+    parser.add_argument("--output", help="Write the sweep as JSON")
+    args = parser.parse_args()
+
+    from inference import DocumentAI
+    pipeline = DocumentAI(model_path=args.model, backend=args.backend)
+    if not pipeline.text_clf:
+        print(f"❌ No text classifier in {args.model}; run train.py first.")
+        sys.exit(1)
+
+    print("🚀 Rendering and OCR'ing held-out pages...")
+    pages = render_pages(args.pages_per_class, args.seed)
+    labels, rule_preds, text_preds, text_probs, text_ms, model_preds, model_ms = [], [], [], [], [], [], []
+    for label, img in pages:
+        img = normalize_image(img, pipeline.max_image_side)
+        words, boxes = get_ocr(img)
+        text = " ".join(words)
+        labels.append(label)
+        rule_preds.append(None if args.skip_rules else RULE_ENGINE.classify(text))
+
+        start = time.perf_counter()
+        pred, prob = pipeline.text_clf.predict(text)
+        text_ms.append((time.perf_counter() - start) * 1000)
+        text_preds.append(pred)
+        text_probs.append(prob)
+
+        start = time.perf_counter()
+        pred, _ = pipeline._classify(img, words, boxes)
+        model_ms.append((time.perf_counter() - start) * 1000)
+        model_preds.append(pred)
+
+    thresholds = [float(t) for t in args.thresholds.split(",") if t.strip()]
+    rows = [sweep(labels, rule_preds, text_preds, text_probs, text_ms, model_preds, model_ms, t) for t in thresholds]
+    unruled = [i for i, r in enumerate(rule_preds) if not r]
+
+    print("\n" + "="*92)
+    print(f"{len(pages)} pages, {len(unruled)} not classified by the rules; "
+          f"text tier {np.mean(text_ms):.2f} ms/doc, LayoutLMv3 {np.mean(model_ms):.1f} ms/doc")
+    print(f"{'threshold':>10}{'rules':>9}{'text':>9}{'model':>9}{'text acc':>11}{'model acc':>11}{'overall':>10}{'ms/doc':>10}")
+    for r in rows:
+        acc = {t: "-" if a is None else f"{a:.1%}" for t, a in r["accuracy"].items()}
+        print(f"{r['threshold']:>10}{r['share']['rules']:>9.1%}{r['share']['text']:>9.1%}{r['share']['model']:>9.1%}"
+              f"{acc['text']:>11}{acc['model']:>11}{r['overall_accuracy']:>10.1%}{r['classify_ms_per_doc']:>10}")
+    print("="*92)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"pages": len(pages), "unruled": len(unruled), "sweep": rows}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
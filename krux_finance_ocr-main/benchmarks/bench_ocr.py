@@ -0,0 +1,111 @@
+"""
+Micro-benchmark for OCR post-processing: the legacy pandas/iterrows normalization that used to
+live in inference.py/train.py versus the vectorized TSV parser in ocr.py.
+
+Tesseract runs once per synthetic page; only parsing and box normalization are timed.
+`--tile` repeats each page's word rows to mimic dense documents such as partnership deeds.
+
+`--engines` additionally times full `get_ocr` calls per engine (pytesseract spawns a tesseract
+process per call, tesserocr reuses pooled in-process handles), the per-call overhead on a blank
+page, and how often each engine's words match the first engine's. Unavailable engines are skipped.
+
+    python -m benchmarks.bench_ocr --pages-per-class 2 --tile 20 --repeat 50
+    python -m benchmarks.bench_ocr --engines pytesseract,tesserocr
+"""
+import io
+import csv
+import time
+import argparse
+import pandas as pd
+import pytesseract
+from ocr import OCR_CONFIG, ENGINES, parse_tsv, normalize_boxes, get_ocr, measure_overhead
+from benchmarks.corpus import render_pages
+
+def legacy_from_tsv(tsv, w, h):
+    # Same DataFrame pytesseract builds for Output.DATAFRAME, followed by the original loop
+    df = pd.read_csv(io.StringIO(tsv), quoting=csv.QUOTE_NONE, sep="\t").dropna()
+    df = df[df.text.str.strip().astype(bool)]
+    words = df.text.astype(str).tolist()
+    boxes = [[max(0,min(1000,int(r['left']/w*1000))), max(0,min(1000,int(r['top']/h*1000))),
+              max(0,min(1000,int((r['left']+r['width'])/w*1000))), max(0,min(1000,int((r['top']+r['height'])/h*1000)))]
+             for _, r in df.iterrows()]
+    return words, boxes
+
+def vectorized_from_tsv(tsv, w, h):
+    words, xywh = parse_tsv(tsv)
+    return words, normalize_boxes(xywh, w, h)
+
+def tile_tsv(tsv, n):
+    lines = tsv.splitlines()
+    return "\n".join(lines[:1] + lines[1:] * n)
+
+def time_per_page(fn, samples, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for tsv, w, h in samples:
+            fn(tsv, w, h)
+    return (time.perf_counter() - start) / (repeat * len(samples)) * 1000
+
+def compare_engines(names, images, repeat):
+    rows, reference = [], None
+    for name in names:
+        try:
+            engine = ENGINES[name]()
+        except ImportError:
+            print(f"⚠️ Skipping {name}: not installed")
+            continue
+        get_ocr(images[0], engine=engine)  # warm-up (loads the language model once for pooled engines)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            outputs = [get_ocr(img, engine=engine)[0] for img in images]
+        page_ms = (time.perf_counter() - start) / (repeat * len(images)) * 1000
+        if reference is None: reference = outputs
+        agreement = sum(a == b for a, b in zip(outputs, reference)) / len(images)
+        rows.append((name, page_ms, measure_overhead(engine), agreement))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR post-processing micro-benchmark")
+    parser.add_argument("--pages-per-class", type=int, default=2)
+    parser.add_argument("--tile", type=int, default=1, help="Repeat word rows N times per page")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--engines", help="Comma-separated OCR engines to compare end to end, e.g. pytesseract,tesserocr")
+    parser.add_argument("--engine-repeat", type=int, default=1, help="Passes over the pages per engine")
+    args = parser.parse_args()
+    for name in (args.engines or "").split(","):
+        if name.strip() and name.strip() not in ENGINES: parser.error(f"Unknown engine: {name} (expected {', '.join(ENGINES)})")
+
+    print("🚀 Rendering and OCR'ing synthetic pages...")
+    samples = []
+    pages = render_pages(args.pages_per_class, args.seed)
+    for _, img in pages:
+        tsv = pytesseract.image_to_data(img, lang="eng", config=OCR_CONFIG, output_type=pytesseract.Output.STRING)
+        samples.append((tile_tsv(tsv, args.tile), *img.size))
+
+    mismatches = 0
+    for tsv, w, h in samples:
+        lw, lb = legacy_from_tsv(tsv, w, h)
+        vw, vb = vectorized_from_tsv(tsv, w, h)
+        if lw != vw or lb != vb.tolist(): mismatches += 1
+
+    n_words = sum(len(parse_tsv(tsv)[0]) for tsv, _, _ in samples) / len(samples)
+    legacy_ms = time_per_page(legacy_from_tsv, samples, args.repeat)
+    vector_ms = time_per_page(vectorized_from_tsv, samples, args.repeat)
+
+    print("\n" + "="*40)
+    print(f"📄 Pages:      {len(samples)} (avg {n_words:.0f} words)")
+    print(f"🐢 Legacy:     {legacy_ms:.3f} ms/page")
+    print(f"⚡ Vectorized: {vector_ms:.3f} ms/page ({legacy_ms / vector_ms:.1f}x)")
+    print(f"🔍 Mismatches: {mismatches}")
+    print("="*40)
+
+    if args.engines:
+        names = [n.strip() for n in args.engines.split(",") if n.strip()]
+        rows = compare_engines(names, [img for _, img in pages], args.engine_repeat)
+        print(f"\n{'engine':<14}{'ms/page':>10}{'overhead ms':>14}{'agreement':>12}")
+        for name, page_ms, overhead_ms, agreement in rows:
+            print(f"{name:<14}{page_ms:>10.1f}{overhead_ms:>14.1f}{agreement:>12.1%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Regression check and benchmark for the rule engine in rules.py against the original
+_heuristic_check/_extract if-chains (copied verbatim below).
+
+The corpus is synthetic OCR-like text: the strings data_generator prints on each page, with random
+casing, spacing, line breaks, labels without values, conflicting keywords and long filler to mimic
+dense documents. Every text is classified and run through every extractor with both implementations.
+
+    python -m benchmarks.bench_rules --docs 2000 --filler-words 5000
+"""
+import re
+import sys
+import time
+import random
+import argparse
+from rules import RULE_ENGINE
+
+# --- Original implementation (inference.DocumentAI before the rule engine) ---
+
+def legacy_classify(text):
+    t = text.upper()
+    if "CORPORATE IDENTITY NUMBER" in t or "CIN" in t: return "COI" if "GST" not in t else None
+    if "GST" in t and "REG-06" in t: return "GST"
+    if "UDYAM" in t and "REGISTRATION" in t: return "UDYAM"
+    if "FSSAI" in t: return "FSSAI"
+    if "GUMASTA" in t or ("FORM F" in t and "ESTABLISHMENTS" in t): return "GUMASTA"
+    if "KARNATAKA" in t and "FORM C" in t: return "EKARMIKA"
+    if "FORM 20" in t or "DRUG" in t: return "DRUG_LICENSE"
+    if "IMPORTER-EXPORTER" in t or "IEC" in t: return "IEC"
+    if "PROFESSION TAX" in t or "FORM II" in t: return "PTEC"
+    if "TAN" in t and "DEDUCTION" in t: return "TAN"
+    if "KOLKATA MUNICIPAL" in t and "ENLISTMENT" in t: return "TRADE_LICENSE_WB"
+    if "DEED OF PARTNERSHIP" in t: return "PARTNERSHIP_DEED"
+    return None
+
+def legacy_extract(doc_type, text):
+    data = {"type": doc_type, "id_number": "Not Found"}
+
+    if doc_type == "GST":
+        # Strict GSTIN: 2 digits + 5 chars + 4 digits + 1 char + 1 char + Z + 1 char
+        match = re.search(r"(?:Number|GSTIN)[\s:\-\.]*([0-9]{2}[A-Z]{5}[0-9]{4}[A-Z]{1}[1-9A-Z]{1}Z[0-9A-Z]{1})", text, re.IGNORECASE)
+        if not match: match = re.search(r"\b[0-9]{2}[A-Z]{5}[0-9]{4}[A-Z]{1}[1-9A-Z]{1}Z[0-9A-Z]{1}\b", text)
+        if match: data["id_number"] = match.group(1)
+
+    elif doc_type == "COI":
+        # Allow optional spaces between CIN parts to be robust to OCR tokenization
+        pattern_ws = r"[LU]\s*[0-9]{5}\s*[A-Z]{2}\s*[0-9]{4}\s*[A-Z]{3}\s*[0-9]{6}"
+        match = re.search(rf"(?:CIN|Identity\s*Number).*?({pattern_ws})", text, re.IGNORECASE | re.DOTALL)
+        if not match:
+            # Fallback: detect bare CIN even if the label wasn't OCR'ed
+            alt = re.search(rf"\b{pattern_ws}\b", text)
+            if alt:
+                data["id_number"] = re.sub(r"\s+", "", alt.group(0))
+        else:
+            data["id_number"] = re.sub(r"\s+", "", match.group(1))
+
+    elif doc_type == "UDYAM":
+        match = re.search(r"UDYAM-[A-Z]{2}-\d{2}-\d{7}", text, re.IGNORECASE)
+        if match: data["id_number"] = match.group(0)
+
+    elif doc_type == "FSSAI":
+        match = re.search(r"(?:License|Lic).*?([0-9]{14})", text, re.IGNORECASE)
+        if match: data["id_number"] = match.group(1)
+
+    elif doc_type == "GUMASTA":
+        match = re.search(r"(?:Registration\s*No)[\s:\-\.]*([A-Z0-9/]{5,25})", text, re.IGNORECASE)
+        if match: data["id_number"] = match.group(1)
+
+    elif doc_type == "IEC":
+        match = re.search(r"(?:IEC\s*Number|Code).*?([0-9]{10})", text, re.IGNORECASE)
+        if match: data["id_number"] = match.group(1)
+
+    elif doc_type == "TAN":
+        match = re.search(r"[A-Z]{4}[0-9]{5}[A-Z]{1}", text)
+        if match: data["id_number"] = match.group(0)
+
+    elif doc_type == "TRADE_LICENSE_WB":
+        match = re.search(r"(?:CE\s*No|Enlistment).*?([0-9]{10,15})", text, re.IGNORECASE)
+        if match: data["id_number"] = match.group(1)
+
+    return data
+
+
+# The legacy GST fallback called match.group(1) on a pattern without groups (IndexError);
+# the engine returns the whole match instead. Texts that hit it are reported separately.
+def legacy_extract_safe(doc_type, text):
+    try:
+        return legacy_extract(doc_type, text)
+    except IndexError:
+        return None
+
+FILLER = ("THE PARTNERS HEREBY AGREE THAT BUSINESS SHALL BE CARRIED ON UNDER NAME AND STYLE OF M/S CAPITAL "
+          "PROFIT LOSS SHARE licence code number registration no lic 12345 date place witness").split()
+
+def page_lines(rng):
+    """Lines of text as printed by one of data_generator's templates (plus a few variations)."""
+    d = lambda n: "".join(rng.choice("0123456789") for _ in range(n))
+    u = lambda n: "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(n))
+    templates = [
+        ["Government of India", "Form GST REG-06", f"Registration Number : 27{u(5)}{d(4)}{u(1)}1Z{u(1)}", "DS GOODS AND SERVICES"],
+        ["Government of India", "Form GST REG-06", f"GSTIN {d(2)}{u(5)}{d(4)}{u(1)}{rng.choice('1A')}Z{d(1)}"],
+        ["Form GST REG-06", f"{d(2)}{u(5)}{d(4)}{u(1)}1Z{d(1)}"],
+        ["MINISTRY OF CORPORATE AFFAIRS", f"Corporate Identity Number: U72900MH{d(4)}PTC{d(6)}", "DS MINISTRY OF CORPORATE"],
+        ["MINISTRY OF CORPORATE AFFAIRS", "CIN", "issued on", f"U 72900 MH {d(4)} PTC {d(6)}"],
+        ["Certificate of Incorporation", f"L{d(5)}KA{d(4)}PLC{d(6)}"],
+        ["FORM 'F'", "Maharashtra Shops and Establishments Act", f"Registration No: MH/MUM/{d(4)}"],
+        ["UDYAM", "REGISTRATION CERTIFICATE", f"UDYAM REGISTRATION NUMBER: UDYAM-MH-03-{d(7)}"],
+        ["Food Safety and Standards Authority of India", f"Lic No: 1{d(2)}{d(11)}"],
+        ["FSSAI", "License", "valid till", f"{d(14)}"],
+        ["GOVERNMENT OF KARNATAKA", "DEPARTMENT OF LABOUR", "FORM C", f"Registration No: KA/BNG/{d(5)}"],
+        ["FORM 20", "LICENCE TO SELL, STOCK OR EXHIBIT DRUGS", "DRUG CONTROL"],
+        ["IMPORTER-EXPORTER CODE CERTIFICATE", f"IEC Number: {d(10)}"],
+        ["FORM II", f"Enrollment Certificate No: 99{d(8)}P", "PROFESSION TAX"],
+        ["TAN ALLOTMENT LETTER", f"TAN: MUM{rng.choice('AB')}{d(5)}C", "TAX DEDUCTION ACCOUNT NUMBER"],
+        ["THE KOLKATA MUNICIPAL CORPORATION", "CERTIFICATE OF ENLISTMENT", d(10)],
+        ["THE KOLKATA MUNICIPAL CORPORATION", "CE No", "", d(12)],
+        ["INDIA NON JUDICIAL", "DEED OF PARTNERSHIP"],
+        ["GST", "CIN", "Corporate Identity Number"],
+        ["Lic", "Lic", "License", "no number here"],
+    ]
+    return list(rng.choice(templates))
+
+def make_text(rng, filler_words):
+    lines = page_lines(rng)
+    if rng.random() < 0.3: lines = [l.lower() if rng.random() < 0.5 else l for l in lines]
+    filler = [" ".join(rng.choice(FILLER) for _ in range(rng.randint(0, 12))) for _ in range(filler_words // 6)]
+    for f in filler: lines.insert(rng.randint(0, len(lines)), f)
+    sep = rng.choice([" ", "\n", "  "])
+    return sep.join(lines)
+
+def make_corpus(n, filler_words, seed):
+    rng = random.Random(seed)
+    return [make_text(rng, rng.randint(0, filler_words)) for _ in range(n)]
+
+def time_ms(classify, extract, classes, texts):
+    start = time.perf_counter()
+    for t in texts:
+        classify(t)
+        for c in classes: extract(c, t)
+    return (time.perf_counter() - start) / len(texts) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Rule engine regression check and benchmark")
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--filler-words", type=int, default=2000, help="Max filler words per document")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.docs, args.filler_words, args.seed)
+    classes = sorted({r[0] for r in RULE_ENGINE.rules})
+
+    mismatches, legacy_errors = 0, 0
+    for text in corpus:
+        if legacy_classify(text) != RULE_ENGINE.classify(text):
+            mismatches += 1
+            print(f"❌ classify mismatch: {text[:120]!r}")
+        for c in classes:
+            expected = legacy_extract_safe(c, text)
+            if expected is None:
+                legacy_errors += 1
+                continue
+            if expected != RULE_ENGINE.extract(c, text):
+                mismatches += 1
+                print(f"❌ extract({c}) mismatch: {text[:120]!r}")
+
+    legacy_ms = time_ms(legacy_classify, legacy_extract_safe, classes, corpus)
+    engine_ms = time_ms(RULE_ENGINE.classify, RULE_ENGINE.extract, classes, corpus)
+    avg_chars = sum(len(t) for t in corpus) / len(corpus)
+
+    print("\n" + "="*40)
+    print(f"📄 Documents:  {len(corpus)} (avg {avg_chars:.0f} chars)")
+    print(f"🐢 Legacy:     {legacy_ms:.3f} ms/doc")
+    print(f"⚡ Engine:     {engine_ms:.3f} ms/doc ({legacy_ms / engine_ms:.1f}x)")
+    print(f"⚠️ Legacy GST fallback crashes skipped: {legacy_errors}")
+    print(f"🔍 Mismatches: {mismatches}")
+    print("="*40)
+    if mismatches: sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+End-to-end throughput and latency benchmark for the KruxOCR service.
+
+A fixed synthetic corpus (page images, 3-page PDFs and large photo-sized images for every class)
+is analyzed by `DocumentAI.analyze` in-process and by the FastAPI app through an in-memory ASGI
+client, each at the requested concurrency and in its own spawned process so peak RSS is per mode.
+With --baseline, the run fails (exit code 1) when docs/sec drops or p95 latency grows by more
+than --tolerance relative to a previous --output file.
+
+    python -m benchmarks.bench_service --concurrency 4 --output bench.json
+    python -m benchmarks.bench_service --concurrency 4 --baseline bench.json --tolerance 0.1
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+import tempfile
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from benchmarks.corpus import build_documents
+
+MODES = ("inprocess", "asgi")
+
+def run_inprocess(options, corpus_dir, docs, concurrency, warmup):
+    import workers
+    from telemetry import collect
+    pipeline = workers.build_pipeline(**options)
+    for _, name in docs[:warmup]:
+        pipeline.analyze(os.path.join(corpus_dir, name))
+
+    def analyze(name):
+        start = time.perf_counter()
+        with collect() as timings:
+            result = pipeline.analyze(os.path.join(corpus_dir, name))
+        return result, timings, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(analyze, [name for _, name in docs]))
+    return outcomes, time.perf_counter() - start
+
+def run_asgi(options, corpus_dir, docs, concurrency, warmup):
+    # The app reads its configuration from the environment at import time
+    env = {"MODEL_PATH": options["model_path"], "MODEL_BACKEND": options["backend"],
+           "BATCH_MAX_SIZE": str(options["batch_max_size"]), "CACHE_SIZE": str(options["cache_size"]),
+           "WORKER_POOL_SIZE": str(concurrency), "WORKER_QUEUE_SIZE": str(concurrency)}
+    os.environ.update(env)
+    import httpx
+    import app as service
+
+    async def analyze(client, semaphore, name):
+        with open(os.path.join(corpus_dir, name), "rb") as f:
+            data = f.read()
+        async with semaphore:
+            start = time.perf_counter()
+            r = await client.post("/analyze", files={"file": (name, data)}, headers={"X-Debug-Timings": "1"})
+            elapsed = time.perf_counter() - start
+        result = r.json() if r.status_code == 200 else {"Error": f"HTTP {r.status_code}"}
+        timings = {k: v / 1000 for k, v in result.pop("Timings", {}).items() if k != "total"}
+        return result, timings, elapsed
+
+    async def drive():
+        transport = httpx.ASGITransport(app=service.app)
+        # ASGITransport does not send lifespan events, so run startup (model load) explicitly
+        async with service.app.router.lifespan_context(service.app), \
+                httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            while (await client.get("/readyz")).status_code != 200:
+                await asyncio.sleep(0.2)
+            semaphore = asyncio.Semaphore(concurrency)
+            for _, name in docs[:warmup]:
+                await analyze(client, semaphore, name)
+            start = time.perf_counter()
+            outcomes = await asyncio.gather(*(analyze(client, semaphore, name) for _, name in docs))
+            return outcomes, time.perf_counter() - start
+
+    return asyncio.run(drive())
+
+RUNNERS = {"inprocess": run_inprocess, "asgi": run_asgi}
+
+def run_mode(mode, options, corpus_dir, docs, concurrency, warmup):
+    outcomes, wall = RUNNERS[mode](options, corpus_dir, docs, concurrency, warmup)
+    return {"outcomes": outcomes, "wall_s": wall, "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+def summarize(mode, out, labels):
+    from telemetry import decision_path
+    results = [r for r, _, _ in out["outcomes"]]
+    lat = np.array([s for _, _, s in out["outcomes"]]) * 1000
+    stages = Counter()
+    for _, timings, _ in out["outcomes"]: stages.update(timings)
+    paths = Counter(decision_path(r) for r in results)
+    return {
+        "mode": mode,
+        "docs": len(results),
+        "docs_per_sec": round(len(results) / out["wall_s"], 3),
+        "p50_ms": round(float(np.percentile(lat, 50)), 1),
+        "p95_ms": round(float(np.percentile(lat, 95)), 1),
+        "p99_ms": round(float(np.percentile(lat, 99)), 1),
+        "peak_rss_mb": round(out["peak_rss_mb"], 1),
+        "path_mix": {p: round(n / len(results), 4) for p, n in sorted(paths.items())},
+        "review_required": round(sum(r.get("Status") == "REVIEW_REQUIRED" for r in results) / len(results), 4),
+        "accuracy": round(float(np.mean([r.get("Type") == l for r, l in zip(results, labels)])), 4),
+        "stage_ms_mean": {k: round(v * 1000 / len(results), 2) for k, v in sorted(stages.items())},
+    }
+
+def compare(rows, baseline, tolerance):
+    """Returns the regressions of `rows` against a previous run's rows, as readable strings."""
+    previous = {r["mode"]: r for r in baseline.get("modes", [])}
+    failures = []
+    for r in rows:
+        b = previous.get(r["mode"])
+        if not b: continue
+        if r["docs_per_sec"] < b["docs_per_sec"] * (1 - tolerance):
+            failures.append(f"{r['mode']}: {r['docs_per_sec']} docs/s vs. baseline {b['docs_per_sec']}")
+        if r["p95_ms"] > b["p95_ms"] * (1 + tolerance):
+            failures.append(f"{r['mode']}: p95 {r['p95_ms']} ms vs. baseline {b['p95_ms']}")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end KruxOCR service benchmark")
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--model", default="Krux01/document_ai_model_12class")
+    parser.add_argument("--backend", default="torch")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=8, help="Micro-batch size (1 disables batching)")
+    parser.add_argument("--cache-size", type=int, default=0, help="Result cache entries (off by default so every document is analyzed)")
+    parser.add_argument("--images-per-class", type=int, default=4)
+    parser.add_argument("--pdfs-per-class", type=int, default=1)
+    parser.add_argument("--large-per-class", type=int, default=1)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the summary as JSON")
+    parser.add_argument("--baseline", help="Previous --output file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative regression vs. the baseline")
+    args = parser.parse_args()
+
+    options = dict(model_path=args.model, backend=args.backend, batch_max_size=args.batch_size, cache_size=args.cache_size)
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    for m in modes:
+        if m not in MODES: parser.error(f"Unknown mode: {m} (expected one of {', '.join(MODES)})")
+
+    # Read the baseline first: it may be the file --output is about to overwrite
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    print("🚀 Building benchmark corpus...")
+    corpus = build_documents(args.images_per_class, args.pdfs_per_class, args.large_per_class, args.seed)
+    docs = [(label, name) for label, name, _ in corpus]
+    labels = [label for label, _ in docs]
+
+    ctx = multiprocessing.get_context("spawn")
+    rows = []
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        for _, name, data in corpus:
+            with open(os.path.join(corpus_dir, name), "wb") as f:
+                f.write(data)
+        for mode in modes:
+            print(f"⏱️ Benchmarking {mode} ({len(docs)} documents, concurrency {args.concurrency})...")
+            with ctx.Pool(1) as pool:
+                out = pool.apply(run_mode, (mode, options, corpus_dir, docs, args.concurrency, args.warmup))
+            rows.append(summarize(mode, out, labels))
+
+    print("\n" + "="*84)
+    print(f"{'mode':<12}{'docs/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'RSS MB':>9}{'model path':>12}{'accuracy':>12}")
+    for r in rows:
+        print(f"{r['mode']:<12}{r['docs_per_sec']:>9}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['peak_rss_mb']:>9}"
+              f"{r['path_mix'].get('model', 0):>12.1%}{r['accuracy']:>12.2%}")
+    print("="*84)
+
+    summary = {"documents": len(docs), "concurrency": args.concurrency, "options": options, "modes": rows}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+
+    if baseline:
+        failures = compare(rows, baseline, args.tolerance)
+        if failures:
+            print("❌ Performance regression:\n  " + "\n  ".join(failures))
+            sys.exit(1)
+        print(f"✅ Within {args.tolerance:.0%} of baseline {args.baseline}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Deterministic synthetic corpora for the benchmarks, built from data_generator's page templates."""
+import io
+import random
+import tempfile
+import numpy as np
+from PIL import Image
+from data_generator import CLASSES, GENERATORS, render_sample
+
+def render_pages(pages_per_class, seed=0):
+    """Returns [(label, RGB image)] with `pages_per_class` pages for each of the 12 classes."""
+    random.seed(seed)
+    np.random.seed(seed)
+    pages = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for c in CLASSES:
+            fn, prefix = GENERATORS[c]
+            for i in range(pages_per_class):
+                path = f"{tmp}/{prefix}_{i}.jpg"
+                fn(path)
+                pages.append((c, Image.open(path).convert("RGB")))
+    return pages
+
+def build_documents(images_per_class=4, pdfs_per_class=1, large_per_class=1, seed=0):
+    """
+    Returns [(label, filename, bytes)] for every class: `images_per_class` page JPEGs,
+    `pdfs_per_class` 3-page PDFs (blank cover, the certificate, blank annexure) and
+    `large_per_class` 3x upscaled JPEGs standing in for phone photos of the certificate.
+    """
+    docs = []
+    for c in CLASSES:
+        i = 0
+        for _ in range(images_per_class):
+            name, data = render_sample(c, i, seed)
+            docs.append((c, name, data))
+            i += 1
+        for _ in range(pdfs_per_class):
+            name, data = render_sample(c, i, seed)
+            page = Image.open(io.BytesIO(data)).convert("RGB")
+            blank = Image.new("RGB", page.size, (255, 255, 255))
+            buf = io.BytesIO()
+            blank.save(buf, format="PDF", save_all=True, append_images=[page, blank.copy()], resolution=200)
+            docs.append((c, name.replace(".jpg", ".pdf"), buf.getvalue()))
+            i += 1
+        for _ in range(large_per_class):
+            name, data = render_sample(c, i, seed)
+            page = Image.open(io.BytesIO(data)).convert("RGB")
+            buf = io.BytesIO()
+            page.resize((page.width * 3, page.height * 3), Image.BICUBIC).save(buf, format="JPEG", quality=90)
+            docs.append((c, name.replace(".jpg", "_large.jpg"), buf.getvalue()))
+            i += 1
+    return docs
@@ -0,0 +1,77 @@
+import random
+import torch
+from torch.utils.data import Sampler
+
+# Token sequences are padded up to the smallest of these lengths that fits; the last is the model's maximum
+BUCKETS = (64, 128, 256, 512)
+MAX_LENGTH = BUCKETS[-1]
+TOKEN_FIELDS = ("input_ids", "bbox", "attention_mask")
+
+def bucket_length(n, buckets=BUCKETS):
+    """Smallest bucket that holds `n` tokens (the largest bucket for anything longer)."""
+    for b in buckets:
+        if n <= b: return b
+    return buckets[-1]
+
+def _fit(v, length, fill, dim):
+    n = v.shape[dim]
+    if n >= length: return v.narrow(dim, 0, length)
+    shape = list(v.shape)
+    shape[dim] = length - n
+    return torch.cat([v, v.new_full(shape, fill)], dim=dim)
+
+def pad_to(enc, length, pad_token_id):
+    """
+    Pads the token fields of a (rows, seq, ...) encoding to `length`, or cuts them down to it when
+    everything past `length` is padding (e.g. samples stored at the maximum length).
+    """
+    out = dict(enc)
+    for k in TOKEN_FIELDS:
+        out[k] = _fit(enc[k], length, pad_token_id if k == "input_ids" else 0, dim=1)
+    return out
+
+class BucketCollator:
+    """Stacks training samples padded only up to the bucket of the longest one in the batch."""
+    def __init__(self, pad_token_id, buckets=BUCKETS):
+        self.pad_token_id = pad_token_id
+        self.buckets = buckets
+
+    def __call__(self, features):
+        length = bucket_length(max(int(f["attention_mask"].sum()) for f in features), self.buckets)
+        batch = {}
+        for k in features[0]:
+            if k in TOKEN_FIELDS:
+                fill = self.pad_token_id if k == "input_ids" else 0
+                batch[k] = torch.stack([_fit(f[k], length, fill, dim=0) for f in features])
+            else:
+                batch[k] = torch.stack([f[k] for f in features])
+        return batch
+
+class LengthBucketSampler(Sampler):
+    """
+    Batch sampler (DataLoader's `batch_sampler`) whose batches each come from a single length bucket,
+    so BucketCollator pads every batch only as far as its bucket. Samples are shuffled within their
+    bucket and batches across buckets, with a new order on every pass; each bucket's last batch may
+    be smaller than `batch_size`.
+    """
+    def __init__(self, lengths, batch_size, buckets=BUCKETS, seed=0):
+        self.groups = {}
+        for i, n in enumerate(lengths):
+            self.groups.setdefault(bucket_length(n, buckets), []).append(i)
+        self.batch_size = batch_size
+        self.seed = seed
+        self.epoch = 0
+
+    def __len__(self):
+        return sum(-(-len(indices) // self.batch_size) for indices in self.groups.values())
+
+    def __iter__(self):
+        rng = random.Random(self.seed + self.epoch)
+        self.epoch += 1
+        batches = []
+        for indices in self.groups.values():
+            indices = indices[:]
+            rng.shuffle(indices)
+            batches += [indices[i:i + self.batch_size] for i in range(0, len(indices), self.batch_size)]
+        rng.shuffle(batches)
+        yield from batches
@@ -0,0 +1,114 @@
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+SUPPORTED_EXTENSIONS = (".jpg", ".jpeg", ".png", ".tif", ".tiff", ".bmp", ".pdf")
+
+def iter_input_dir(root):
+    """Yields every supported document under `root`, recursively, in a stable order."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for f in sorted(filenames):
+            if f.lower().endswith(SUPPORTED_EXTENSIONS):
+                yield os.path.join(dirpath, f)
+
+def read_manifest(path):
+    """Reads one document path per line; blank lines and `#` comments are ignored."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line
+
+def checkpoint_path(output):
+    # Parquet can't be appended to, so results are journaled as JSONL and converted at the end
+    return output if output.endswith(".jsonl") else f"{output}.jsonl"
+
+def load_done(checkpoint):
+    """Returns the paths already recorded in a checkpoint, ignoring a truncated final line."""
+    done = set()
+    if not os.path.exists(checkpoint): return done
+    with open(checkpoint, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)["path"])
+            except (ValueError, KeyError):
+                continue
+    return done
+
+def trim_checkpoint(checkpoint):
+    """Cuts off a final line left incomplete by an interrupted run, so new records start on a line of their own."""
+    if not os.path.exists(checkpoint): return
+    with open(checkpoint, "rb+") as f:
+        pos = f.seek(0, os.SEEK_END)
+        # Scan backwards in chunks for the last newline rather than reading the whole journal
+        while pos > 0:
+            step = min(64 * 1024, pos)
+            f.seek(pos - step)
+            i = f.read(step).rfind(b"\n")
+            if i >= 0:
+                f.truncate(pos - step + i + 1)
+                return
+            pos -= step
+        f.truncate(0)
+
+def write_parquet(checkpoint, output):
+    import pandas as pd
+    rows = []
+    with open(checkpoint, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            res = rec.get("result", {})
+            rows.append({
+                "path": rec["path"],
+                "type": res.get("Type"),
+                "confidence": res.get("Confidence"),
+                "status": res.get("Status"),
+                "id_number": res.get("Data", {}).get("id_number"),
+                "error": res.get("Error"),
+                "result": json.dumps(res),
+            })
+    pd.DataFrame(rows).to_parquet(output, index=False)
+
+def run_bulk(pipeline, paths, output, workers=4):
+    """
+    Analyzes `paths` with one shared pipeline on a thread pool, appending one JSON line per document
+    to the checkpoint as soon as it finishes. Paths already in the checkpoint are skipped, so an
+    interrupted run picks up where it stopped. Returns (processed, previously_done).
+    """
+    checkpoint = checkpoint_path(output)
+    done = load_done(checkpoint)
+    trim_checkpoint(checkpoint)
+    todo = (p for p in paths if p not in done)
+    processed, start = 0, time.perf_counter()
+
+    def analyze(path):
+        try:
+            return path, pipeline.analyze(path)
+        except Exception as e:
+            return path, {"Error": f"Processing Error: {str(e)}"}
+
+    with open(checkpoint, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        while True:
+            # Keep a bounded number of documents in flight instead of submitting the whole corpus
+            for path in todo:
+                pending.add(executor.submit(analyze, path))
+                if len(pending) >= workers * 2: break
+            if not pending: break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                path, result = fut.result()
+                out.write(json.dumps({"path": path, "result": result}) + "\n")
+                processed += 1
+            out.flush()
+            if processed % 100 < len(finished):
+                print(f"📄 {processed} documents ({processed / (time.perf_counter() - start):.1f} docs/sec)")
+
+    if output.endswith(".parquet"):
+        write_parquet(checkpoint, output)
+    return processed, len(done)
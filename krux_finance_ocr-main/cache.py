@@ -0,0 +1,144 @@
+import os
+import copy
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+def content_key(data, version):
+    """Cache key for a document: hash of its bytes plus the model/OCR configuration that produced the result."""
+    h = hashlib.sha256(data)
+    h.update(b"\0" + version.encode("utf-8"))
+    return h.hexdigest()
+
+class ResultCache:
+    """
+    Two-tier cache of analysis results keyed by `content_key`.
+    The memory tier is an LRU of at most `max_items` entries. The optional disk tier stores one JSON
+    file per key under `disk_dir`, evicting the least recently used files once `disk_max_mb` is exceeded.
+    Entries older than `ttl_s` seconds (if set) are treated as misses in both tiers.
+    """
+    def __init__(self, max_items=1024, disk_dir=None, disk_max_mb=512, ttl_s=None):
+        self.max_items = max_items
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = int(disk_max_mb * 1024 * 1024)
+        self.ttl_s = ttl_s or None
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._counts = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._disk_bytes = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._disk_bytes = sum(os.path.getsize(p) for p in self._disk_files())
+
+    def _expired(self, stored_at):
+        return self.ttl_s is not None and time.time() - stored_at > self.ttl_s
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _disk_files(self):
+        return [os.path.join(self.disk_dir, f) for f in os.listdir(self.disk_dir) if f.endswith(".json")]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and not self._expired(entry[1]):
+                self._memory.move_to_end(key)
+                self._counts["memory_hits"] += 1
+                return copy.deepcopy(entry[0])
+            if entry: del self._memory[key]
+        hit = self._disk_get(key)
+        with self._lock:
+            if hit is None:
+                self._counts["misses"] += 1
+                return None
+            self._counts["disk_hits"] += 1
+        # Keep the disk entry's write time so promotion to memory doesn't restart its TTL
+        result, stored_at = hit
+        self._memory_put(key, copy.deepcopy(result), stored_at)
+        return result
+
+    def put(self, key, result):
+        self._memory_put(key, copy.deepcopy(result), time.time())
+        if self.disk_dir: self._disk_put(key, result)
+
+    def _memory_put(self, key, result, stored_at):
+        if self.max_items <= 0: return
+        with self._lock:
+            self._memory[key] = (result, stored_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+                self._counts["evictions"] += 1
+
+    def _disk_get(self, key):
+        """Returns (result, time it was written) or None."""
+        if not self.disk_dir: return None
+        path = self._disk_path(key)
+        try:
+            stored_at = os.path.getmtime(path)
+            if self._expired(stored_at):
+                self._disk_remove(path)
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                result = json.load(f)
+            os.utime(path, (time.time(), stored_at))  # atime marks recent use for eviction
+            return result, stored_at
+        except (OSError, ValueError):
+            return None
+
+    def _disk_put(self, key, result):
+        path = self._disk_path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(result, f)
+            os.replace(tmp, path)
+        except OSError:
+            return
+        with self._lock:
+            self._disk_bytes += os.path.getsize(path)
+            over = self._disk_bytes > self.disk_max_bytes
+        if over: self._disk_evict()
+
+    def _disk_remove(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            self._disk_bytes -= size
+            self._counts["evictions"] += 1
+
+    def _disk_evict(self):
+        # Drop expired files first, then least recently used until under the size limit
+        files = []
+        for p in self._disk_files():
+            try:
+                st = os.stat(p)
+            except OSError:
+                continue
+            files.append((self._expired(st.st_mtime), max(st.st_atime, st.st_mtime), st.st_size, p))
+        files.sort(key=lambda f: (not f[0], f[1]))
+        total = sum(f[2] for f in files)
+        for expired, _, size, path in files:
+            if total <= self.disk_max_bytes and not expired: break
+            self._disk_remove(path)
+            total -= size
+        with self._lock:
+            self._disk_bytes = max(0, total)
+
+    def stats(self):
+        with self._lock:
+            hits = self._counts["memory_hits"] + self._counts["disk_hits"]
+            lookups = hits + self._counts["misses"]
+            return {
+                **self._counts,
+                "hits": hits,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_items": len(self._memory),
+                "disk_bytes": self._disk_bytes if self.disk_dir else None,
+            }
@@ -1,5 +1,10 @@
 import os
+import io
 import random
+import tarfile
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from PIL import Image, ImageDraw
 from utils import get_font, create_mock_qr, ensure_dir
 
@@ -10,7 +15,12 @@ CLASSES = [
     "TRADE_LICENSE_WB", "PARTNERSHIP_DEED"
 ]
 
-def generate_gst(filename):
+def _finish(img, filename):
+    # Templates return the page; they also save it when given a filename
+    if filename: img.save(filename)
+    return img
+
+def generate_gst(filename=None):
     img = Image.new('RGB', (1000, 1400), (255, 255, 255))
     draw = ImageDraw.Draw(img)
     draw.text((400, 50), "Government of India", fill="black", font=get_font(30, True))
@@ -18,9 +28,9 @@ def generate_gst(filename):
     gstin = f"27{random.randint(10000,99999)}A1Z5"
     draw.text((50, 220), f"Registration Number : {gstin}", fill="black", font=get_font(22, True))
     draw.text((600, 930), "DS GOODS AND SERVICES", fill="black", font=get_font(18))
-    img.save(filename)
+    return _finish(img, filename)
 
-def generate_coi(filename):
+def generate_coi(filename=None):
     img = Image.new('RGB', (1000, 1400), (245, 245, 245))
     draw = ImageDraw.Draw(img)
     draw.text((280, 100), "MINISTRY OF CORPORATE AFFAIRS", fill="black", font=get_font(24, True))
@@ -28,9 +38,9 @@ def generate_coi(filename):
     draw.text((50, 500), f"Corporate Identity Number: {cin}", fill="black", font=get_font(20, True))
     draw.rectangle([600, 900, 850, 1000], fill="yellow", outline="black")
     draw.text((620, 920), "DS MINISTRY OF CORPORATE", fill="black", font=get_font(18))
-    img.save(filename)
+    return _finish(img, filename)
 
-def generate_gumasta(filename):
+def generate_gumasta(filename=None):
     img = Image.new('RGB', (1400, 1000), (255, 250, 240))
     draw = ImageDraw.Draw(img)
     draw.text((600, 50), "FORM 'F'", fill="black", font=get_font(36, True))
@@ -38,9 +48,9 @@ def generate_gumasta(filename):
     lic_no = f"MH/MUM/{random.randint(1000,9999)}"
     draw.text((100, 250), f"Registration No: {lic_no}", fill="red", font=get_font(28, True))
     draw.ellipse([1000, 600, 1200, 800], outline="blue", width=5)
-    img.save(filename)
+    return _finish(img, filename)
 
-def generate_udyam(filename):
+def generate_udyam(filename=None):
     img = Image.new('RGB', (1000, 1400), (255, 255, 255))
     draw = ImageDraw.Draw(img)
     draw.text((400, 180), "UDYAM", fill="darkblue", font=get_font(48, True))
@@ -49,95 +59,160 @@ def generate_udyam(filename):
     img.paste(qr, (750, 50))
     udyam_no = f"UDYAM-MH-03-{random.randint(1000000,9999999)}"
     draw.text((250, 350), f"UDYAM REGISTRATION NUMBER: {udyam_no}", fill="black", font=get_font(24, True))
-    img.save(filename)
+    return _finish(img, filename)
 
-def generate_fssai(filename):
+def generate_fssai(filename=None):
     img = Image.new('RGB', (1000, 1400), (255, 255, 255))
     draw = ImageDraw.Draw(img)
     draw.text((300, 100), "Food Safety and Standards Authority of India", fill="darkblue", font=get_font(24, True))
     fssai_no = f"1{random.randint(10,20)}{random.randint(10000000000,99999999999)}"
     draw.text((350, 200), f"Lic No: {fssai_no}", fill="black", font=get_font(36, True))
-    img.save(filename)
+    return _finish(img, filename)
 
-def generate_ekarmika(filename):
+def generate_ekarmika(filename=None):
     img = Image.new('RGB', (1000, 1400), (255, 255, 255))
     draw = ImageDraw.Draw(img)
     draw.text((350, 50), "GOVERNMENT OF KARNATAKA", fill="black", font=get_font(28, True))
     draw.text((400, 90), "DEPARTMENT OF LABOUR", fill="black", font=get_font(24, True))
     reg_no = f"KA/BNG/{random.randint(10000,99999)}"
     draw.text((100, 250), f"Registration No: {reg_no}", fill="red", font=get_font(26, True))
-    img.save(filename)
+    return _finish(img, filename)
 
-def generate_drug_license(filename):
+def generate_drug_license(filename=None):
     img = Image.new('RGB', (1000, 1400), (240, 255, 240))
     draw = ImageDraw.Draw(img)
     draw.text((400, 50), "FORM 20", fill="black", font=get_font(32, True))
     draw.text((200, 150), "LICENCE TO SELL, STOCK OR EXHIBIT DRUGS", fill="black", font=get_font(24, True))
     draw.text((750, 1080), "DRUG CONTROL", fill="purple", font=get_font(18, True))
-    img.save(filename)
+    return _finish(img, filename)
 
-def generate_iec(filename):
+def generate_iec(filename=None):
     img = Image.new('RGB', (1000, 1400), (255, 255, 255))
     draw = ImageDraw.Draw(img)
     draw.text((300, 250), "IMPORTER-EXPORTER CODE CERTIFICATE", fill="darkblue", font=get_font(26, True))
     iec_code = f"{random.randint(1000000000, 9999999999)}"
     draw.text((100, 350), f"IEC Number: {iec_code}", fill="black", font=get_font(30, True))
-    img.save(filename)
+    return _finish(img, filename)
 
-def generate_ptec(filename):
+def generate_ptec(filename=None):
     img = Image.new('RGB', (1000, 1400), (255, 255, 255))
     draw = ImageDraw.Draw(img)
     draw.text((350, 50), "FORM II", fill="black", font=get_font(32, True))
     ptec_no = f"99{random.randint(10000000,99999999)}P"
     draw.text((100, 250), f"Enrollment Certificate No: {ptec_no}", fill="black", font=get_font(24, True))
-    img.save(filename)
+    return _finish(img, filename)
 
-def generate_tan(filename):
+def generate_tan(filename=None):
     img = Image.new('RGB', (1000, 1400), (255, 255, 255))
     draw = ImageDraw.Draw(img)
     draw.text((400, 100), "TAN ALLOTMENT LETTER", fill="black", font=get_font(24, True))
     tan_no = f"MUM{random.choice(['A','B'])}{random.randint(10000,99999)}C"
     draw.rectangle([300, 200, 700, 300], outline="black", width=2)
     draw.text((350, 240), f"TAN: {tan_no}", fill="black", font=get_font(36, True))
-    img.save(filename)
+    return _finish(img, filename)
 
-def generate_trade_license_wb(filename):
+def generate_trade_license_wb(filename=None):
     img = Image.new('RGB', (1000, 1400), (255, 255, 255))
     draw = ImageDraw.Draw(img)
     draw.text((300, 50), "THE KOLKATA MUNICIPAL CORPORATION", fill="darkblue", font=get_font(26, True))
     draw.text((350, 150), "CERTIFICATE OF ENLISTMENT", fill="red", font=get_font(28, True))
     ce_no = f"{random.randint(1000000000, 9999999999)}"
     draw.text((600, 270), ce_no, fill="black", font=get_font(24, True))
-    img.save(filename)
+    return _finish(img, filename)
 
-def generate_partnership_deed(filename):
+def generate_partnership_deed(filename=None):
     img = Image.new('RGB', (1000, 1400), (240, 255, 240))
     draw = ImageDraw.Draw(img)
     draw.rectangle([50, 50, 950, 300], outline="green", width=5)
     draw.text((400, 80), "INDIA NON JUDICIAL", fill="black", font=get_font(30, True))
     draw.text((350, 350), "DEED OF PARTNERSHIP", fill="black", font=get_font(32, True))
-    img.save(filename)
+    return _finish(img, filename)
+
+# Generator function and filename prefix for each class
+GENERATORS = {
+    "GST": (generate_gst, "gst"),
+    "COI": (generate_coi, "coi"),
+    "GUMASTA": (generate_gumasta, "gumasta"),
+    "UDYAM": (generate_udyam, "udyam"),
+    "FSSAI": (generate_fssai, "fssai"),
+    "EKARMIKA": (generate_ekarmika, "eka"),
+    "DRUG_LICENSE": (generate_drug_license, "dl"),
+    "IEC": (generate_iec, "iec"),
+    "PTEC": (generate_ptec, "ptec"),
+    "TAN": (generate_tan, "tan"),
+    "TRADE_LICENSE_WB": (generate_trade_license_wb, "tl"),
+    "PARTNERSHIP_DEED": (generate_partnership_deed, "deed"),
+}
+
+def sample_seed(seed, cls, i):
+    """Seed for one page, so output depends only on (seed, class, index), not on worker scheduling."""
+    return (seed * 1_000_003 + CLASSES.index(cls) * 10_000_019 + i) % (2 ** 32)
+
+def render_sample(cls, i, seed):
+    """Renders page `i` of class `cls` and returns (filename, JPEG bytes)."""
+    random.seed(sample_seed(seed, cls, i))
+    np.random.seed(sample_seed(seed, cls, i))
+    fn, prefix = GENERATORS[cls]
+    buf = io.BytesIO()
+    fn().save(buf, format="JPEG")
+    return f"{prefix}_{i}.jpg", buf.getvalue()
+
+def _write_files(out, shard_id, items, seed):
+    for cls, i in items:
+        name, data = render_sample(cls, i, seed)
+        with open(os.path.join(out, cls, name), "wb") as f:
+            f.write(data)
+    return len(items)
+
+def _write_tar(out, shard_id, items, seed):
+    # WebDataset layout: members sharing a key (<prefix>_<i>) form one sample (.jpg image + .cls label)
+    path = os.path.join(out, f"shard-{shard_id:06d}.tar")
+    with tarfile.open(f"{path}.tmp", "w") as tar:
+        for cls, i in items:
+            name, data = render_sample(cls, i, seed)
+            key = os.path.splitext(name)[0]
+            for member, payload in ((f"{key}.jpg", data), (f"{key}.cls", cls.encode())):
+                info = tarfile.TarInfo(member)
+                info.size = len(payload)
+                info.mtime = 0  # byte-identical shards for the same seed
+                tar.addfile(info, io.BytesIO(payload))
+    os.replace(f"{path}.tmp", path)
+    return len(items)
+
+WRITERS = {"files": _write_files, "tar": _write_tar}
+
+def generate(samples_per_class=25, out="dataset", seed=42, workers=None, fmt="files", shard_size=1000):
+    """Renders `samples_per_class` pages of every class in a process pool and returns the page count."""
+    if fmt == "files":
+        for c in CLASSES: ensure_dir(os.path.join(out, c))
+    else:
+        ensure_dir(out)
+    items = [(c, i) for i in range(samples_per_class) for c in CLASSES]
+    # Tar shards are `shard_size` pages; loose files are split finer so small runs still use every worker
+    chunk = shard_size if fmt == "tar" else max(1, min(shard_size, len(items) // (4 * (workers or os.cpu_count() or 1))))
+    shards = [items[k:k + chunk] for k in range(0, len(items), chunk)]
+    write = WRITERS[fmt]
+    done = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(write, out, n, shard, seed) for n, shard in enumerate(shards)]
+        for future in as_completed(futures):
+            done += future.result()
+            print(f"   {done}/{len(items)} pages")
+    return done
 
 def main():
-    print("🚀 Generating Dataset for 12 Classes...")
-    for c in CLASSES:
-        ensure_dir(f"dataset/{c}")
-
-    # Generate 25 samples per class
-    for i in range(25):
-        generate_gst(f"dataset/GST/gst_{i}.jpg")
-        generate_coi(f"dataset/COI/coi_{i}.jpg")
-        generate_gumasta(f"dataset/GUMASTA/gumasta_{i}.jpg")
-        generate_udyam(f"dataset/UDYAM/udyam_{i}.jpg")
-        generate_fssai(f"dataset/FSSAI/fssai_{i}.jpg")
-        generate_ekarmika(f"dataset/EKARMIKA/eka_{i}.jpg")
-        generate_drug_license(f"dataset/DRUG_LICENSE/dl_{i}.jpg")
-        generate_iec(f"dataset/IEC/iec_{i}.jpg")
-        generate_ptec(f"dataset/PTEC/ptec_{i}.jpg")
-        generate_tan(f"dataset/TAN/tan_{i}.jpg")
-        generate_trade_license_wb(f"dataset/TRADE_LICENSE_WB/tl_{i}.jpg")
-        generate_partnership_deed(f"dataset/PARTNERSHIP_DEED/deed_{i}.jpg")
-    
+    parser = argparse.ArgumentParser(description="Generate the synthetic 12-class certificate dataset")
+    parser.add_argument("--samples-per-class", type=int, default=25)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--seed", type=int, default=42, help="Same seed, same pages, regardless of --workers")
+    parser.add_argument("--out", default="dataset")
+    parser.add_argument("--format", choices=list(WRITERS), default="files",
+                        help="files: <out>/<CLASS>/<prefix>_<i>.jpg; tar: WebDataset-style <out>/shard-NNNNNN.tar")
+    parser.add_argument("--shard-size", type=int, default=1000, help="Pages per tar shard")
+    args = parser.parse_args()
+
+    print(f"🚀 Generating Dataset for 12 Classes ({args.samples_per_class} samples each)...")
+    generate(args.samples_per_class, args.out, args.seed, args.workers, args.format, args.shard_size)
     print("✅ Dataset Generation Complete.")
 
 if __name__ == "__main__":
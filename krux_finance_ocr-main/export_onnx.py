@@ -0,0 +1,28 @@
+import os
+import argparse
+from transformers import LayoutLMv3ForSequenceClassification
+from backends import ONNX_FILES, export_onnx, quantize_onnx
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the trained classifier to ONNX for the onnx/onnx-int8 backends")
+    parser.add_argument("--model", default="./saved_12class_model", help="Directory written by train.py")
+    parser.add_argument("--quantize", action="store_true", help="Also write a dynamically quantized int8 graph")
+    parser.add_argument("--opset", type=int, default=17)
+    args = parser.parse_args()
+
+    print(f"⬇️ Loading model from: {args.model}...")
+    model = LayoutLMv3ForSequenceClassification.from_pretrained(args.model)
+
+    fp32_path = os.path.join(args.model, ONNX_FILES["onnx"])
+    print(f"📦 Exporting {fp32_path}...")
+    export_onnx(model, fp32_path, opset=args.opset)
+
+    if args.quantize:
+        int8_path = os.path.join(args.model, ONNX_FILES["onnx-int8"])
+        print(f"📦 Quantizing to {int8_path}...")
+        quantize_onnx(fp32_path, int8_path)
+
+    print("✅ Export Complete. Serve it with MODEL_PATH=<model dir> MODEL_BACKEND=onnx (or onnx-int8).")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import os
+import json
+import hashlib
+import numpy as np
+import torch
+from concurrent.futures import ProcessPoolExecutor
+from bucketing import MAX_LENGTH
+
+# name -> (dtype, per-sample shape); input_ids switch to int32 for vocabularies beyond uint16
+FIELDS = {
+    "input_ids": (np.uint16, (MAX_LENGTH,)),
+    "bbox": (np.int16, (MAX_LENGTH, 4)),
+    "attention_mask": (np.uint8, (MAX_LENGTH,)),
+    "pixel_values": (np.float16, (3, 224, 224)),
+}
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+# Per-process state for the parallel build
+_processor = None
+_ocr_config = None
+
+def _init_worker(processor_path, ocr_config):
+    global _processor, _ocr_config
+    from transformers import LayoutLMv3Processor
+    _processor = LayoutLMv3Processor.from_pretrained(processor_path, apply_ocr=False)
+    _ocr_config = ocr_config
+
+def _encode_file(path):
+    from PIL import Image
+    from ocr import get_ocr
+    try:
+        img = Image.open(path).convert("RGB")
+        words, boxes = get_ocr(img, config=_ocr_config)
+        enc = _processor(img, words, boxes=boxes.tolist(), truncation=True, padding="max_length", max_length=MAX_LENGTH, return_tensors="np")
+    except Exception as e:
+        return path, None, f"{type(e).__name__}: {e}"
+    return path, {k: enc[k][0] for k in FIELDS}, words
+
+class FeatureStore:
+    """
+    Memory-mapped store of OCR'd and encoded training samples, keyed by the SHA-256 of each image.
+
+    Every `build` writes the samples it had to (re)process into a new shard directory of `.npy`
+    arrays; `index.json` maps each key to (shard, row), or to null for images that could not be
+    encoded so they are not retried until their content changes. Shards are opened lazily with copy-on-write
+    mmaps, so reads are zero-copy and a store handed to DataLoader workers only pickles its path.
+    """
+    def __init__(self, root):
+        self.root = root
+        self.meta_path = os.path.join(root, "meta.json")
+        self.index_path = os.path.join(root, "index.json")
+        self.index = {}
+        self.meta = None
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                self.index = json.load(f)
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                self.meta = json.load(f)
+        self._shards = {}
+        self._words = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_shards"], state["_words"] = {}, {}
+        return state
+
+    def __len__(self):
+        return sum(1 for v in self.index.values() if v is not None)
+
+    def __contains__(self, key):
+        return self.index.get(key) is not None
+
+    def build(self, paths, processor_path, ocr_config="", workers=None):
+        """OCRs and encodes every image whose content hash is not in the store yet. Returns the keys of `paths`."""
+        meta = {"processor": processor_path, "ocr_config": ocr_config, "max_length": MAX_LENGTH}
+        if self.meta and self.meta != meta:
+            raise ValueError(f"Feature store {self.root} was built with {self.meta}; use a new directory for {meta}")
+
+        keys = [file_hash(p) for p in paths]
+        todo = {}
+        for p, k in zip(paths, keys):
+            if k not in self.index: todo.setdefault(k, p)
+        if not todo:
+            return keys
+
+        os.makedirs(self.root, exist_ok=True)
+        shard = f"shard_{len({v[0] for v in self.index.values() if v}):05d}"
+        shard_dir = os.path.join(self.root, shard)
+        os.makedirs(shard_dir, exist_ok=True)
+        n = len(todo)
+        print(f"🧮 Encoding {n} new images into {shard_dir} ({len(self)} cached)...")
+
+        from transformers import LayoutLMv3Processor
+        vocab = len(LayoutLMv3Processor.from_pretrained(processor_path, apply_ocr=False).tokenizer)
+        dtypes = {k: (np.int32 if k == "input_ids" and vocab > np.iinfo(np.uint16).max else dt) for k, (dt, _) in FIELDS.items()}
+        arrays = {k: np.lib.format.open_memmap(os.path.join(shard_dir, f"{k}.npy"), mode="w+", dtype=dtypes[k], shape=(n, *shape))
+                  for k, (_, shape) in FIELDS.items()}
+        lengths = np.zeros(n, dtype=np.int16)
+        words, new_index = [], {}
+        path_to_key = {p: k for k, p in todo.items()}
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(processor_path, ocr_config)) as executor:
+            for path, enc, extra in executor.map(_encode_file, list(todo.values()), chunksize=4):
+                if enc is None:
+                    print(f"⚠️ Skipping {path}: {extra}")
+                    new_index[path_to_key[path]] = None
+                    continue
+                row = len(words)
+                for k in FIELDS: arrays[k][row] = enc[k]
+                lengths[row] = int(enc["attention_mask"].sum())
+                words.append(extra)
+                new_index[path_to_key[path]] = [shard, row]
+
+        for a in arrays.values(): a.flush()
+        np.save(os.path.join(shard_dir, "lengths.npy"), lengths)
+        with open(os.path.join(shard_dir, "words.json"), "w", encoding="utf-8") as f:
+            json.dump(words, f)
+
+        # Index last, so an interrupted build leaves the previous store intact
+        self.index.update(new_index)
+        self.meta = meta
+        with open(self.meta_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        tmp = f"{self.index_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.index, f)
+        os.replace(tmp, self.index_path)
+        return keys
+
+    def _shard(self, name):
+        shard = self._shards.get(name)
+        if shard is None:
+            d = os.path.join(self.root, name)
+            shard = {k: np.load(os.path.join(d, f"{k}.npy"), mmap_mode="c") for k in (*FIELDS, "lengths")}
+            self._shards[name] = shard
+        return shard
+
+    def get(self, key):
+        """Returns the encoded sample as arrays viewing the memory map (no copy)."""
+        shard, row = self.index[key]
+        arrays = self._shard(shard)
+        return {k: arrays[k][row] for k in FIELDS}
+
+    def tensors(self, key):
+        """The sample as model inputs: int64 ids/boxes/mask and float32 pixels, cast straight from the map."""
+        return {k: torch.from_numpy(v.astype(np.float32 if k == "pixel_values" else np.int64)) for k, v in self.get(key).items()}
+
+    def length(self, key):
+        """Number of real (non-padding) tokens of a sample."""
+        shard, row = self.index[key]
+        return int(self._shard(shard)["lengths"][row])
+
+    def words(self, key):
+        """OCR words of a sample."""
+        shard, row = self.index[key]
+        if shard not in self._words:
+            with open(os.path.join(self.root, shard, "words.json"), "r", encoding="utf-8") as f:
+                self._words[shard] = json.load(f)
+        return self._words[shard][row]
@@ -1,32 +1,113 @@
 import os
-import re
+import io
+import hashlib
 import torch
-import pytesseract
 import argparse
+import threading
+from collections import Counter
 from PIL import Image
-from pdf2image import convert_from_path
-from transformers import LayoutLMv3Processor, LayoutLMv3ForSequenceClassification
 from data_generator import CLASSES
+from ocr import get_ocr, get_engine, OCR_CONFIG, EMPTY_BOX
+from cache import content_key
+from rules import RULE_ENGINE
+from backends import TorchBackend, OnnxBackend, onnx_path, resolve_precision
+from bucketing import bucket_length, pad_to, MAX_LENGTH
+from pdf_pages import count_pages, iter_pages, open_pdf
+from preprocess import normalize_image, header_band, MAX_IMAGE_SIDE, HEADER_FRACTION
+from telemetry import span
+from workers import ModelNotReady, ModelLoadFailed
 
-# Ensure Tesseract is in PATH
-# pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+# Bump whenever rules, extraction or OCR post-processing change what analyze() returns,
+# so cached results from older builds are not served.
+PIPELINE_VERSION = "4"
 
-def get_ocr(image):
-    w, h = image.size
-    df = pytesseract.image_to_data(image, output_type=pytesseract.Output.DATAFRAME, lang='eng', config='--oem 3 --psm 6').dropna()
-    df = df[df.text.str.strip().astype(bool)]
-    words = df.text.astype(str).tolist()
-    boxes = [[max(0,min(1000,int(r['left']/w*1000))), max(0,min(1000,int(r['top']/h*1000))),
-              max(0,min(1000,int((r['left']+r['width'])/w*1000))), max(0,min(1000,int((r['top']+r['height'])/h*1000)))]
-             for _, r in df.iterrows()]
-    if not words: words, boxes = ["empty"], [[0,0,1000,1000]]
-    return words, boxes
+def model_stamp(model_dir):
+    """
+    Short digest of the names, sizes and mtimes of the files in a local model directory (config,
+    weights, ONNX graphs, text_clf.joblib), so a retrained model saved to the same path gets a new
+    cache version. Hub models are identified by name only.
+    """
+    if not os.path.isdir(model_dir): return "hub"
+    h = hashlib.sha1()
+    for entry in sorted(os.scandir(model_dir), key=lambda e: e.name):
+        if entry.is_file():
+            st = entry.stat()
+            h.update(f"{entry.name}:{st.st_size}:{st.st_mtime_ns};".encode())
+    return h.hexdigest()[:12]
 
 class DocumentAI:
-    def __init__(self, model_path="Krux01/document_ai_model_12class"):
+    def __init__(self, model_path="Krux01/document_ai_model_12class", pdf_max_pages=50, early_stop_conf=0.9, pdf_spill_mb=8,
+                 backend="torch", max_image_side=MAX_IMAGE_SIDE, header_fraction=HEADER_FRACTION, text_clf_threshold=0.95,
+                 precision="fp32", compile_model=False, threads=None, dynamic_padding=True, window_stride=128, lazy=False):
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.model_path = model_path
-        
+        self.pdf_max_pages = pdf_max_pages
+        self.early_stop_conf = early_stop_conf
+        self.pdf_spill_bytes = int(pdf_spill_mb * 1024 * 1024)
+        self.max_image_side = max_image_side
+        self.header_fraction = header_fraction
+        self.ocr_paths = Counter()
+        self._ocr_paths_lock = threading.Lock()
+        self.loaded_model = model_path
+        self.backend_name = backend
+        self.model = self.processor = self.backend = None
+        # Torch fast path: bf16 autocast (`auto` = where the hardware supports it) and torch.compile;
+        # `threads` sizes ONNX Runtime's intra-op pool (torch threads are per process, see workers.build_pipeline)
+        self.precision = resolve_precision(precision, self.device) if backend == "torch" else "fp32"
+        self.compile_model = compile_model
+        self.threads = threads
+        # Encodings are padded to the next length bucket (64/128/256/512) instead of always to 512;
+        # pages beyond 512 tokens are split into windows overlapping by `window_stride` tokens
+        self.dynamic_padding = dynamic_padding
+        self.window_stride = window_stride
+        # Optional text-only tier (text_clf.joblib next to a local model): answers when at least this confident
+        self.text_clf = None
+        self.text_clf_threshold = text_clf_threshold
+        # Set once the classifier is loaded and warm; until then only rule-matched documents can be served
+        self.model_ready = threading.Event()
+        # Set by workers.start_loading when loading fails; documents needing the model then error out
+        self.load_error = None
+
+        self.id2label = {i: c for i, c in enumerate(CLASSES)}
+        self.batcher = None
+        self.cache = None
+        self._set_cache_version()
+        if not lazy: self.load_model()
+
+    def _set_cache_version(self):
+        text_tier = self.text_clf_threshold if self.text_clf else "off"
+        self.cache_version = f"{self.loaded_model}|{model_stamp(self.loaded_model)}|{self.backend_name}|{self.precision}|{get_engine().name}|{OCR_CONFIG}|{self.max_image_side}|{self.header_fraction}|{text_tier}|{self.window_stride}|{PIPELINE_VERSION}"
+
+    def load_model(self, warm_up=True):
+        """Loads the processor and classifier, optionally runs a warm-up forward pass, then marks the model ready."""
+        # The text tier is small, so load it first: it can serve documents while LayoutLMv3 loads
+        if os.path.isdir(self.model_path):
+            from text_classifier import TextClassifier
+            self.text_clf = TextClassifier.load(self.model_path)
+            if self.text_clf: print(f"⬇️ Loaded text classifier tier (threshold {self.text_clf_threshold:.2f})")
+        if self.backend_name == "torch":
+            self._load_torch(self.model_path)
+            self.backend = TorchBackend(self.model, self.device, self.precision, self.compile_model)
+            print(f"⚙️ Torch inference: {self.precision}{', torch.compile' if self.compile_model else ''}, {torch.get_num_threads()} threads")
+        else:
+            from transformers import LayoutLMv3Processor
+            # Exported graphs live next to the processor files in a local model directory (see export_onnx.py)
+            path = onnx_path(self.model_path, self.backend_name)
+            print(f"⬇️ Loading ONNX model from: {path}...")
+            self.processor = LayoutLMv3Processor.from_pretrained(self.model_path, apply_ocr=False)
+            self.backend = OnnxBackend(path, self.threads or 0)
+        # The torch loader may have fallen back to the base model
+        self._set_cache_version()
+        if warm_up: self.warm_up()
+        self.model_ready.set()
+
+    def warm_up(self):
+        """One forward pass on a blank page so the first real request doesn't pay for lazy initialization."""
+        img = Image.new("RGB", (1000, 1400), (255, 255, 255))
+        self._predict_batch([self._encode(img, ["warmup"], EMPTY_BOX)])
+
+    def _load_torch(self, model_path):
+        from transformers import LayoutLMv3Processor, LayoutLMv3ForSequenceClassification
         # Handle subfolder for the specific Krux model
         subfolder = "document_ai_model_12class" if model_path == "Krux01/document_ai_model_12class" else None
         
@@ -42,121 +123,226 @@ class DocumentAI:
         except OSError as e:
             print(f"⚠️ Failed to load model from {model_path}: {e}")
             print("⚠️ Using base model (untrained) for testing structure.")
+            self.loaded_model = "microsoft/layoutlmv3-base"
             self.model = LayoutLMv3ForSequenceClassification.from_pretrained("microsoft/layoutlmv3-base", num_labels=len(CLASSES)).to(self.device).eval()
             self.processor = LayoutLMv3Processor.from_pretrained("microsoft/layoutlmv3-base", apply_ocr=False)
-            
-        self.id2label = {i: c for i, c in enumerate(CLASSES)}
 
-    def _heuristic_check(self, text):
-        t = text.upper()
-        if "CORPORATE IDENTITY NUMBER" in t or "CIN" in t: return "COI" if "GST" not in t else None
-        if "GST" in t and "REG-06" in t: return "GST"
-        if "UDYAM" in t and "REGISTRATION" in t: return "UDYAM"
-        if "FSSAI" in t: return "FSSAI"
-        if "GUMASTA" in t or ("FORM F" in t and "ESTABLISHMENTS" in t): return "GUMASTA"
-        if "KARNATAKA" in t and "FORM C" in t: return "EKARMIKA"
-        if "FORM 20" in t or "DRUG" in t: return "DRUG_LICENSE"
-        if "IMPORTER-EXPORTER" in t or "IEC" in t: return "IEC"
-        if "PROFESSION TAX" in t or "FORM II" in t: return "PTEC"
-        if "TAN" in t and "DEDUCTION" in t: return "TAN"
-        if "KOLKATA MUNICIPAL" in t and "ENLISTMENT" in t: return "TRADE_LICENSE_WB"
-        if "DEED OF PARTNERSHIP" in t: return "PARTNERSHIP_DEED"
-        return None
+    def enable_batching(self, max_batch_size=8, max_wait_ms=10):
+        """Route model-fallback documents through a shared micro-batching scheduler."""
+        from batching import MicroBatcher
+        self.batcher = MicroBatcher(self._predict_batch, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+        return self.batcher
 
-    def _extract(self, doc_type, text):
-        data = {"type": doc_type, "id_number": "Not Found"}
-
-        if doc_type == "GST":
-            # Strict GSTIN: 2 digits + 5 chars + 4 digits + 1 char + 1 char + Z + 1 char
-            match = re.search(r"(?:Number|GSTIN)[\s:\-\.]*([0-9]{2}[A-Z]{5}[0-9]{4}[A-Z]{1}[1-9A-Z]{1}Z[0-9A-Z]{1})", text, re.IGNORECASE)
-            if not match: match = re.search(r"\b[0-9]{2}[A-Z]{5}[0-9]{4}[A-Z]{1}[1-9A-Z]{1}Z[0-9A-Z]{1}\b", text)
-            if match: data["id_number"] = match.group(1)
-
-        elif doc_type == "COI":
-            # Allow optional spaces between CIN parts to be robust to OCR tokenization
-            pattern_ws = r"[LU]\s*[0-9]{5}\s*[A-Z]{2}\s*[0-9]{4}\s*[A-Z]{3}\s*[0-9]{6}"
-            match = re.search(rf"(?:CIN|Identity\s*Number).*?({pattern_ws})", text, re.IGNORECASE | re.DOTALL)
-            if not match:
-                # Fallback: detect bare CIN even if the label wasn't OCR'ed
-                alt = re.search(rf"\b{pattern_ws}\b", text)
-                if alt:
-                    data["id_number"] = re.sub(r"\s+", "", alt.group(0))
-            else:
-                data["id_number"] = re.sub(r"\s+", "", match.group(1))
-
-        elif doc_type == "UDYAM":
-            match = re.search(r"UDYAM-[A-Z]{2}-\d{2}-\d{7}", text, re.IGNORECASE)
-            if match: data["id_number"] = match.group(0)
-
-        elif doc_type == "FSSAI":
-            match = re.search(r"(?:License|Lic).*?([0-9]{14})", text, re.IGNORECASE)
-            if match: data["id_number"] = match.group(1)
+    def enable_cache(self, cache):
+        """Serve repeated uploads of the same document from a ResultCache."""
+        self.cache = cache
+        return cache
 
-        elif doc_type == "GUMASTA":
-            match = re.search(r"(?:Registration\s*No)[\s:\-\.]*([A-Z0-9/]{5,25})", text, re.IGNORECASE)
-            if match: data["id_number"] = match.group(1)
+    def _encode(self, img, words, boxes):
+        """Encodes a page as one row per window of at most 512 tokens, padded up to its length bucket."""
+        enc = self.processor(img, words, boxes=boxes.tolist(), truncation=True, max_length=MAX_LENGTH, stride=self.window_stride,
+                             return_overflowing_tokens=True, padding="longest", return_tensors="pt")
+        # With overflowing windows the processor returns the page image once per window, as a list
+        pixel_values = enc["pixel_values"]
+        if isinstance(pixel_values, list): pixel_values = torch.stack(pixel_values)
+        enc = {"input_ids": enc["input_ids"], "bbox": enc["bbox"], "attention_mask": enc["attention_mask"], "pixel_values": pixel_values}
+        length = bucket_length(enc["input_ids"].shape[1]) if self.dynamic_padding else MAX_LENGTH
+        return pad_to(enc, length, self.processor.tokenizer.pad_token_id)
 
-        elif doc_type == "IEC":
-            match = re.search(r"(?:IEC\s*Number|Code).*?([0-9]{10})", text, re.IGNORECASE)
-            if match: data["id_number"] = match.group(1)
+    def _predict_batch(self, encs):
+        """
+        Runs one forward pass over several encodings (padded to the longest one's bucket) and returns
+        the logits of each, averaged over its windows.
+        """
+        length = max(e["input_ids"].shape[1] for e in encs)
+        pad_id = self.processor.tokenizer.pad_token_id
+        encs = [pad_to(e, length, pad_id) for e in encs]
+        keys = ("input_ids", "bbox", "pixel_values", "attention_mask")
+        inputs = {k: torch.cat([e[k] for e in encs]) for k in keys}
+        logits = self.backend.predict(inputs)
+        return [l.mean(dim=0, keepdim=True) for l in torch.split(logits, [e["input_ids"].shape[0] for e in encs])]
 
-        elif doc_type == "TAN":
-            match = re.search(r"[A-Z]{4}[0-9]{5}[A-Z]{1}", text)
-            if match: data["id_number"] = match.group(0)
+    def _classify(self, img, words, boxes):
+        if self.load_error is not None:
+            raise ModelLoadFailed(f"The classifier failed to load: {self.load_error}")
+        if not self.model_ready.is_set():
+            raise ModelNotReady("The classifier is still loading")
+        with span("encode"):
+            enc = self._encode(img, words, boxes)
+        # Includes the wait for a micro-batch to form
+        with span("model"):
+            logits = self.batcher.submit(enc) if self.batcher else self._predict_batch([enc])[0]
+        probs = torch.softmax(logits, dim=1)
+        return self.id2label[logits.argmax(-1).item()], probs.max().item()
 
-        elif doc_type == "TRADE_LICENSE_WB":
-            match = re.search(r"(?:CE\s*No|Enlistment).*?([0-9]{10,15})", text, re.IGNORECASE)
-            if match: data["id_number"] = match.group(1)
+    def _heuristic_check(self, text):
+        return RULE_ENGINE.classify(text)
 
-        return data
+    def _extract(self, doc_type, text):
+        return RULE_ENGINE.extract(doc_type, text)
 
     def analyze(self, image_path):
         if not os.path.exists(image_path):
             return {"Error": "File not found"}
-            
+        with open(image_path, "rb") as f:
+            data = f.read()
+        return self.analyze_bytes(data, filename=image_path)
+
+    def analyze_bytes(self, data, filename=None):
+        """Analyzes an image or PDF held in memory, e.g. an upload buffer."""
+        if not self.cache:
+            return self._analyze_bytes(data, filename)
+
+        with span("cache"):
+            key = content_key(data, self.cache_version)
+            result = self.cache.get(key)
+        if result is None:
+            result = self._analyze_bytes(data, filename)
+            if "Error" not in result: self.cache.put(key, result)
+        return result
+
+    def analyze_image(self, img):
+        """Analyzes an already decoded PIL image."""
+        return self._analyze_page(normalize_image(img, self.max_image_side))[0]
+
+    def _analyze_bytes(self, data, filename=None):
+        if data[:5] == b"%PDF-" or (filename or "").lower().endswith('.pdf'):
+            with open_pdf(data, self.pdf_spill_bytes) as source:
+                return self._analyze_pdf(source)
         try:
-            if image_path.lower().endswith('.pdf'):
-                # Convert first page of PDF to image at moderate DPI for speed/accuracy
-                images = convert_from_path(image_path, dpi=200, first_page=1, last_page=1)
-                if not images:
-                    return {"Error": "Empty PDF"}
-                img = images[0].convert("RGB")
-            else:
-                img = Image.open(image_path).convert("RGB")
+            with span("decode"):
+                img = normalize_image(Image.open(io.BytesIO(data)), self.max_image_side)
         except Exception as e:
             return {"Error": f"Failed to load image: {str(e)}"}
+        return self._analyze_page(img)[0]
+
+    def _analyze_pdf(self, source):
+        """
+        Streams the PDF page by page and returns the best page's result plus per-page results.
+        Stops at the first page classified by the rules or with softmax >= early_stop_conf.
+        """
+        try:
+            with span("pdf_render"):
+                page_count = count_pages(source)
+        except Exception as e:
+            return {"Error": f"Failed to load image: {str(e)}"}
+        if page_count < 1:
+            return {"Error": "Empty PDF"}
+
+        pages, best, best_score = [], None, None
+        stream = iter_pages(source, max_pages=self.pdf_max_pages, page_count=page_count)
+        try:
+            while True:
+                # Only rendering failures are caught: OCR/model errors (e.g. ModelNotReady) reach the caller
+                try:
+                    with span("pdf_render"):
+                        item = next(stream, None)
+                        if item is None: break
+                        page, img = item
+                        img = normalize_image(img, self.max_image_side)
+                except Exception as e:
+                    if not pages: return {"Error": f"Failed to load image: {str(e)}"}
+                    print(f"⚠️ Stopped reading PDF after page {len(pages)}: {e}")
+                    break
+                result, score = self._analyze_page(img)
+                pages.append({"Page": page, **result})
+                # Rule-based beats AI, then higher confidence, then a successful extraction
+                score = (score[0], score[1], result["Status"] == "VALID")
+                if best_score is None or score > best_score:
+                    best, best_score = result, score
+                if score[0] or score[1] >= self.early_stop_conf: break
+        finally:
+            stream.close()
+        if best is None:
+            return {"Error": "Empty PDF"}
 
-        words, boxes = get_ocr(img)
+        return {**best, "PageCount": page_count, "PagesAnalyzed": len(pages), "Pages": pages}
+
+    def _count_ocr_path(self, path):
+        with self._ocr_paths_lock:
+            self.ocr_paths[path] += 1
+            total = sum(self.ocr_paths.values())
+            if total % 100 == 0:
+                summary = ", ".join(f"{k}={v / total:.0%}" for k, v in sorted(self.ocr_paths.items()))
+                print(f"📊 OCR paths after {total} pages: {summary}")
+
+    def _header_pass(self, img):
+        """Cheap OCR of the header band; returns a result only if it both classifies and extracts an ID."""
+        with span("ocr_header"):
+            words, _ = get_ocr(header_band(img, self.header_fraction))
+        with span("rules"):
+            text = " ".join(words)
+            doc_type = self._heuristic_check(text)
+            data = self._extract(doc_type, text) if doc_type else None
+        if not doc_type: return None
+        if data["id_number"] == "Not Found": return None
+        return {"Type": doc_type, "Confidence": "100% (Rule-Based)", "Status": "VALID", "Data": data}
+
+    def _analyze_page(self, img):
+        """Classifies and extracts a single page. Returns (result, (is_rule_based, probability))."""
+        # 0. Header band fast path; full-page OCR only runs when it can't settle the document
+        if self.header_fraction:
+            result = self._header_pass(img)
+            if result:
+                self._count_ocr_path("header")
+                return result, (True, 1.0)
+        self._count_ocr_path("full_page")
+
+        with span("ocr"):
+            words, boxes = get_ocr(img)
         full_text = " ".join(words)
 
         # 1. Heuristics
-        doc_type = self._heuristic_check(full_text)
+        with span("rules"):
+            doc_type = self._heuristic_check(full_text)
         conf = "100% (Rule-Based)"
+        score = (True, 1.0)
 
-        # 2. AI Model (Fallback)
+        # 2. Text classifier: cheap tier, only trusted above its threshold
+        if not doc_type and self.text_clf:
+            with span("text_clf"):
+                label, prob = self.text_clf.predict(full_text)
+            if prob >= self.text_clf_threshold:
+                doc_type, conf, score = label, f"{prob:.2%} (Text)", (False, prob)
+
+        # 3. AI Model (Fallback)
         if not doc_type:
-            enc = self.processor(img, words, boxes=boxes, truncation=True, padding="max_length", max_length=512, return_tensors="pt")
-            with torch.no_grad():
-                logits = self.model(input_ids=enc.input_ids.to(self.device), bbox=enc.bbox.to(self.device), pixel_values=enc.pixel_values.to(self.device), attention_mask=enc.attention_mask.to(self.device)).logits
-            doc_type = self.id2label[logits.argmax(-1).item()]
-            conf = f"{torch.softmax(logits, dim=1).max().item():.2%} (AI)"
-
-        # 3. Extraction
-        data = self._extract(doc_type, full_text)
+            doc_type, prob = self._classify(img, words, boxes)
+            conf = f"{prob:.2%} (AI)"
+            score = (False, prob)
+
+        # 4. Extraction
+        with span("rules"):
+            data = self._extract(doc_type, full_text)
         status = "VALID" if data["id_number"] != "Not Found" else "REVIEW_REQUIRED"
 
-        return {"Type": doc_type, "Confidence": conf, "Status": status, "Data": data}
+        return {"Type": doc_type, "Confidence": conf, "Status": status, "Data": data}, score
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="KruxOCR Inference")
-    parser.add_argument("image_path", help="Path to the image file")
+    parser.add_argument("image_path", nargs="?", help="Path to the image file")
+    parser.add_argument("--input-dir", help="Analyze every document under this directory")
+    parser.add_argument("--manifest", help="Analyze the documents listed in this file (one path per line)")
+    parser.add_argument("--output", default="results.jsonl", help="Bulk results file (.jsonl or .parquet)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Bulk worker threads")
+    parser.add_argument("--batch-size", type=int, default=8, help="Max documents per model forward pass in bulk mode")
     args = parser.parse_args()
-    
-    pipeline = DocumentAI()
-    res = pipeline.analyze(args.image_path)
-    
-    print("\n" + "="*40)
-    print(f"📄 Type:   {res.get('Type')}")
-    print(f"⚠️ Status: {res.get('Status')}")
-    print(f"📂 Data:   {res.get('Data')}")
-    print("="*40)
+
+    if args.input_dir or args.manifest:
+        from bulk import iter_input_dir, read_manifest, run_bulk
+        pipeline = DocumentAI()
+        if args.batch_size > 1: pipeline.enable_batching(max_batch_size=args.batch_size)
+        paths = iter_input_dir(args.input_dir) if args.input_dir else read_manifest(args.manifest)
+        processed, done = run_bulk(pipeline, paths, args.output, workers=args.workers)
+        print(f"✅ Processed {processed} documents ({done} already done) -> {args.output}")
+    elif args.image_path:
+        pipeline = DocumentAI()
+        res = pipeline.analyze(args.image_path)
+
+        print("\n" + "="*40)
+        print(f"📄 Type:   {res.get('Type')}")
+        print(f"⚠️ Status: {res.get('Status')}")
+        print(f"📂 Data:   {res.get('Data')}")
+        print("="*40)
+    else:
+        parser.error("Provide an image path, --input-dir or --manifest")
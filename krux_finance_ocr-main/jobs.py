@@ -0,0 +1,343 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import asyncio
+import ipaddress
+from urllib.parse import urlsplit
+from contextlib import contextmanager
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,            -- queued | running | done | failed
+    filename TEXT,
+    webhook_url TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    result TEXT,
+    error TEXT,
+    webhook_status TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    available_at REAL NOT NULL,      -- queued jobs are not claimed before this time (retry backoff)
+    worker_id TEXT,                  -- process running the job
+    lease_until REAL                 -- renewed while it runs; an expired lease means the process died
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, available_at, created_at);
+"""
+# Columns added after the first release, for databases created before them
+MIGRATIONS = {"worker_id": "ALTER TABLE jobs ADD COLUMN worker_id TEXT",
+              "lease_until": "ALTER TABLE jobs ADD COLUMN lease_until REAL"}
+
+class JobStore:
+    """
+    Persistent job queue in a SQLite database under `root`; uploaded documents are kept as files
+    in `root/payloads` until their job finishes. Every method opens its own connection, so the
+    store can be used from any thread. Several processes (e.g. uvicorn workers) can share `root`:
+    each claims jobs under its own `worker_id` with a lease of `lease_s` seconds that its
+    dispatcher renews, and only jobs whose lease has expired are recovered.
+    """
+    def __init__(self, root, max_attempts=3, retry_backoff_s=2.0, lease_s=60.0):
+        self.root = root
+        self.payload_dir = os.path.join(root, "payloads")
+        os.makedirs(self.payload_dir, exist_ok=True)
+        self.db_path = os.path.join(root, "jobs.sqlite3")
+        self.max_attempts = max_attempts
+        self.retry_backoff_s = retry_backoff_s
+        self.lease_s = lease_s
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+            columns = {row["name"] for row in db.execute("PRAGMA table_info(jobs)")}
+            for column, ddl in MIGRATIONS.items():
+                if column not in columns: db.execute(ddl)
+
+    @contextmanager
+    def _connect(self):
+        # Autocommit connection; claim() opens its own transaction
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def _payload_path(self, job_id):
+        return os.path.join(self.payload_dir, job_id)
+
+    def submit(self, data, filename=None, webhook_url=None):
+        job_id = uuid.uuid4().hex
+        tmp = f"{self._payload_path(job_id)}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, self._payload_path(job_id))
+        now = time.time()
+        with self._connect() as db:
+            db.execute("INSERT INTO jobs (id, status, filename, webhook_url, max_attempts, created_at, updated_at, available_at) "
+                       "VALUES (?, 'queued', ?, ?, ?, ?, ?, ?)", (job_id, filename, webhook_url, self.max_attempts, now, now, now))
+        return job_id
+
+    def claim(self):
+        """Marks the oldest due queued job as running and returns it with its payload, or None."""
+        now = time.time()
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute("SELECT * FROM jobs WHERE status = 'queued' AND available_at <= ? "
+                             "ORDER BY created_at LIMIT 1", (now,)).fetchone()
+            if row is None:
+                db.execute("COMMIT")
+                return None
+            db.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ?, worker_id = ?, lease_until = ? "
+                       "WHERE id = ?", (now, self.worker_id, now + self.lease_s, row["id"]))
+            db.execute("COMMIT")
+        job = dict(row, status="running", attempts=row["attempts"] + 1, worker_id=self.worker_id)
+        try:
+            with open(self._payload_path(job["id"]), "rb") as f:
+                job["data"] = f.read()
+        except FileNotFoundError:
+            self._finish(job["id"], "failed", error="Uploaded document is missing")
+            return None
+        return job
+
+    def complete(self, job_id, result):
+        self._finish(job_id, "done", result=json.dumps(result))
+
+    def fail(self, job_id, error, retry=True):
+        """Requeues the job with exponential backoff while it has attempts left, else marks it failed."""
+        with self._connect() as db:
+            row = db.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if retry and row and row["attempts"] < row["max_attempts"]:
+                now = time.time()
+                delay = self.retry_backoff_s * 2 ** (row["attempts"] - 1)
+                db.execute("UPDATE jobs SET status = 'queued', error = ?, updated_at = ?, available_at = ? WHERE id = ?",
+                           (error, now, now + delay, job_id))
+                return False
+        self._finish(job_id, "failed", error=error)
+        return True
+
+    def release(self, job_id, delay_s=0.0):
+        """Puts a job this process is running back in the queue without counting the attempt (e.g. the service was busy)."""
+        now = time.time()
+        with self._connect() as db:
+            db.execute("UPDATE jobs SET status = 'queued', attempts = attempts - 1, updated_at = ?, available_at = ? "
+                       "WHERE id = ? AND status = 'running' AND worker_id = ?",
+                       (now, now + delay_s, job_id, self.worker_id))
+
+    def renew(self, job_ids):
+        """Extends the lease of jobs this process is still running."""
+        if not job_ids: return
+        with self._connect() as db:
+            db.executemany("UPDATE jobs SET lease_until = ? WHERE id = ? AND status = 'running' AND worker_id = ?",
+                           [(time.time() + self.lease_s, job_id, self.worker_id) for job_id in job_ids])
+
+    def _finish(self, job_id, status, result=None, error=None):
+        with self._connect() as db:
+            db.execute("UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?",
+                       (status, result, error, time.time(), job_id))
+        try:
+            os.remove(self._payload_path(job_id))
+        except FileNotFoundError:
+            pass
+
+    def set_webhook_status(self, job_id, status):
+        with self._connect() as db:
+            db.execute("UPDATE jobs SET webhook_status = ? WHERE id = ?", (status, job_id))
+
+    def get(self, job_id):
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None: return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def recover(self):
+        """
+        Requeues running jobs whose lease has expired, i.e. whose process died; jobs other live
+        processes are running keep their lease. The interrupted run counts as an attempt, so a
+        document that keeps crashing the service ends up failed instead of looping. Returns how many.
+        """
+        now = time.time()
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            rows = db.execute("SELECT id, attempts, max_attempts FROM jobs WHERE status = 'running' "
+                              "AND (lease_until IS NULL OR lease_until < ?)", (now,)).fetchall()
+            failed = [row["id"] for row in rows if row["attempts"] >= row["max_attempts"]]
+            for row in rows:
+                if row["id"] in failed:
+                    db.execute("UPDATE jobs SET status = 'failed', error = 'Worker stopped; no attempts left', updated_at = ? "
+                               "WHERE id = ?", (now, row["id"]))
+                else:
+                    db.execute("UPDATE jobs SET status = 'queued', error = 'Worker stopped', updated_at = ?, available_at = ? "
+                               "WHERE id = ?", (now, now, row["id"]))
+            db.execute("COMMIT")
+        for job_id in failed:
+            try:
+                os.remove(self._payload_path(job_id))
+            except FileNotFoundError:
+                pass
+        return len(rows)
+
+    def purge(self, older_than_s):
+        """Deletes finished jobs last updated more than `older_than_s` seconds ago."""
+        with self._connect() as db:
+            return db.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                              (time.time() - older_than_s,)).rowcount
+
+    def stats(self):
+        with self._connect() as db:
+            return {row["status"]: row["n"] for row in db.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")}
+
+def check_webhook_url(url, allowed_hosts=()):
+    """
+    Raises ValueError unless `url` may receive job results. With `allowed_hosts` (hostnames, or
+    '.example.com' for a domain and its subdomains) only those hosts are accepted; otherwise the
+    host must resolve to public addresses only, so results can't be sent to loopback, private,
+    link-local (e.g. cloud metadata) or other internal endpoints.
+    """
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower().rstrip(".")
+    if parts.scheme not in ("http", "https") or not host:
+        raise ValueError("webhook_url must be an http(s) URL")
+    if allowed_hosts:
+        if not any(host == h or (h.startswith(".") and (host.endswith(h) or host == h[1:])) for h in allowed_hosts):
+            raise ValueError(f"webhook host {host} is not allowed")
+        return
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, parts.port or 443, proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, UnicodeError):
+        raise ValueError(f"webhook host {host} does not resolve")
+    for address in addresses:
+        if not ipaddress.ip_address(address.split("%")[0]).is_global:
+            raise ValueError(f"webhook host {host} resolves to a non-public address")
+
+def job_view(job):
+    """Public representation of a job for GET /jobs/{id} and webhooks."""
+    view = {k: job[k] for k in ("id", "status", "filename", "attempts", "created_at", "updated_at")}
+    if job["status"] == "done": view["result"] = job["result"]
+    if job["error"] and job["status"] != "done": view["error"] = job["error"]
+    return view
+
+class JobRunner:
+    """
+    Dispatches queued jobs to `analyze(data, filename)` (a coroutine returning the analyze result)
+    with at most `concurrency` jobs in flight. Exceptions in `busy_errors` put the job back without
+    using an attempt, and if `ready()` (optional) returns False no more jobs are claimed until it
+    returns True, e.g. while the model loads. Exceptions in `fatal_errors` fail the job at once; any
+    other exception is retried up to the job's max_attempts. When a job finishes, its webhook (if any)
+    receives the job view as JSON. While running it keeps the leases of its in-flight jobs alive and
+    requeues jobs of processes that stopped renewing theirs.
+    """
+    def __init__(self, store, analyze, concurrency=2, busy_errors=(), fatal_errors=(), ready=None, poll_s=0.5,
+                 webhook_timeout_s=10, webhook_attempts=3, webhook_hosts=()):
+        self.store = store
+        self.webhook_hosts = webhook_hosts
+        self.analyze = analyze
+        self.concurrency = concurrency
+        self.busy_errors = busy_errors
+        self.fatal_errors = fatal_errors
+        self.ready = ready
+        self._paused = False
+        self.poll_s = poll_s
+        self.webhook_timeout_s = webhook_timeout_s
+        self.webhook_attempts = webhook_attempts
+        self._wakeup = None
+        self._running = {}  # task -> job id
+
+    def notify(self):
+        """Wakes the dispatcher after a submission instead of waiting for the next poll."""
+        if self._wakeup: self._wakeup.set()
+
+    async def run_forever(self):
+        self._wakeup = asyncio.Event()
+        slots = asyncio.Semaphore(self.concurrency)
+        leases = asyncio.ensure_future(self._maintain_leases())
+        try:
+            await self._dispatch(slots)
+        finally:
+            leases.cancel()
+
+    async def _maintain_leases(self):
+        """Renews the leases of in-flight jobs and recovers jobs whose process stopped renewing theirs."""
+        while True:
+            await asyncio.to_thread(self.store.renew, list(self._running.values()))
+            recovered = await asyncio.to_thread(self.store.recover)
+            if recovered: print(f"♻️ Recovered {recovered} jobs left running by a stopped worker")
+            await asyncio.sleep(self.store.lease_s / 3)
+
+    async def _dispatch(self, slots):
+        while True:
+            await slots.acquire()
+            # Claiming jobs while they can only be put back would requeue them in a loop
+            while self._paused and not self.ready():
+                await asyncio.sleep(self.poll_s)
+            self._paused = False
+            job = await asyncio.to_thread(self.store.claim)
+            if job is None:
+                slots.release()
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_s)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            task = asyncio.ensure_future(self._process(job, slots))
+            self._running[task] = job["id"]
+            task.add_done_callback(self._running.pop)
+
+    async def _process(self, job, slots):
+        try:
+            try:
+                result = await self.analyze(job["data"], job["filename"])
+            except self.busy_errors:
+                await asyncio.to_thread(self.store.release, job["id"], self.poll_s)
+                if self.ready and not self.ready(): self._paused = True
+                return
+            except self.fatal_errors as e:
+                await asyncio.to_thread(self.store.fail, job["id"], f"Processing Error: {str(e)}", False)
+                await self._notify_webhook(job)
+                return
+            except Exception as e:
+                final = await asyncio.to_thread(self.store.fail, job["id"], f"Processing Error: {str(e)}")
+                if final: await self._notify_webhook(job)
+                return
+            # Errors such as an unreadable image are properties of the document, so they are not retried
+            if "Error" in result:
+                await asyncio.to_thread(self.store.fail, job["id"], result["Error"], False)
+            else:
+                await asyncio.to_thread(self.store.complete, job["id"], result)
+            await self._notify_webhook(job)
+        finally:
+            slots.release()
+
+    async def _notify_webhook(self, job):
+        if not job["webhook_url"]: return
+        # Checked again at delivery time, since the host's DNS may have changed since submission
+        try:
+            await asyncio.to_thread(check_webhook_url, job["webhook_url"], self.webhook_hosts)
+        except ValueError as e:
+            await asyncio.to_thread(self.store.set_webhook_status, job["id"], f"Rejected: {e}")
+            return
+        import httpx
+        payload = job_view(await asyncio.to_thread(self.store.get, job["id"]))
+        status = None
+        async with httpx.AsyncClient(timeout=self.webhook_timeout_s) as client:
+            for attempt in range(self.webhook_attempts):
+                try:
+                    r = await client.post(job["webhook_url"], json=payload)
+                    status = f"HTTP {r.status_code}"
+                    if r.status_code < 500: break
+                except httpx.HTTPError as e:
+                    status = f"{type(e).__name__}: {e}"
+                await asyncio.sleep(2 ** attempt)
+        await asyncio.to_thread(self.store.set_webhook_status, job["id"], status)
+
+    async def stop(self):
+        """Cancels in-flight jobs and puts them back in the queue without using an attempt."""
+        for task, job_id in list(self._running.items()):
+            task.cancel()
+            await asyncio.to_thread(self.store.release, job_id)
@@ -0,0 +1,169 @@
+import os
+import re
+import time
+import queue
+import threading
+import numpy as np
+import pytesseract
+from PIL import Image
+
+# Ensure Tesseract is in PATH
+# pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+
+OCR_CONFIG = "--oem 3 --psm 6"
+EMPTY_BOX = np.array([[0, 0, 1000, 1000]], dtype=np.int16)
+
+def parse_tsv(tsv):
+    """
+    Parses Tesseract TSV output into (words, xywh) where xywh is an (N, 4) int32 array of
+    left/top/width/height in pixels. Structural rows (pages, blocks, lines) and blank words are skipped.
+    """
+    words, coords = [], []
+    for line in tsv.splitlines():
+        cols = line.split("\t")
+        # level page block par line word left top width height conf text
+        if len(cols) < 12 or cols[0] != "5": continue
+        text = cols[11].strip()
+        if not text: continue
+        words.append(text)
+        coords.append(cols[6:10])
+    return words, np.array(coords, dtype=np.int32).reshape(-1, 4)
+
+def normalize_boxes(xywh, width, height):
+    """Converts pixel xywh boxes to LayoutLM's 0-1000 x0/y0/x1/y1 scale in one vectorized pass."""
+    corners = np.concatenate([xywh[:, :2], xywh[:, :2] + xywh[:, 2:]], axis=1)
+    scaled = np.trunc(corners / np.array([width, height, width, height], dtype=np.float64) * 1000)
+    return np.clip(scaled, 0, 1000).astype(np.int16)
+
+class PytesseractEngine:
+    """Runs the `tesseract` CLI per call: a process spawn, temp image file and traineddata load every time."""
+    name = "pytesseract"
+
+    def tsv(self, image, lang, config):
+        return pytesseract.image_to_data(image, lang=lang, config=config, output_type=pytesseract.Output.STRING)
+
+def _parse_config(config):
+    """Splits a tesseract CLI config string into (oem, psm, variables) for the in-process API."""
+    oem = re.search(r"--oem\s+(\d+)", config)
+    psm = re.search(r"--psm\s+(\d+)", config)
+    variables = tuple(re.findall(r"-c\s+(\w+)=(\S+)", config))
+    # Same defaults as the CLI: default OCR engine, fully automatic page segmentation
+    return int(oem.group(1)) if oem else 3, int(psm.group(1)) if psm else 3, variables
+
+class TesserocrEngine:
+    """
+    Pool of long-lived in-process Tesseract handles (tesserocr.PyTessBaseAPI). Each handle loads its
+    traineddata once and receives the PIL image in memory. Handles are keyed by (lang, oem,
+    variables), created on demand up to `size` per key, and used by one thread at a time.
+    """
+    name = "tesserocr"
+
+    def __init__(self, size=None):
+        import tesserocr
+        self._tesserocr = tesserocr
+        self.size = size or os.cpu_count() or 1
+        self._lock = threading.Lock()
+        self._pools = {}  # key -> (Queue of idle handles, number created)
+
+    def _acquire(self, key):
+        with self._lock:
+            idle, created = self._pools.setdefault(key, (queue.Queue(), 0))
+            create = idle.empty() and created < self.size
+            if create: self._pools[key] = (idle, created + 1)
+        if not create:
+            return idle.get()
+        lang, oem, variables = key
+        try:
+            api = self._tesserocr.PyTessBaseAPI(lang=lang, oem=oem)
+            for name, value in variables: api.SetVariable(name, value)
+        except Exception:
+            with self._lock:
+                self._pools[key] = (idle, self._pools[key][1] - 1)
+            raise
+        return api
+
+    def tsv(self, image, lang, config):
+        oem, psm, variables = _parse_config(config)
+        key = (lang, oem, variables)
+        api = self._acquire(key)
+        try:
+            api.SetPageSegMode(psm)
+            api.SetImage(image)
+            # Unlike image_to_data, GetTSVText has no header row; parse_tsv only reads word rows anyway
+            return api.GetTSVText(0)
+        finally:
+            api.Clear()
+            self._pools[key][0].put(api)
+
+ENGINES = {"pytesseract": PytesseractEngine, "tesserocr": TesserocrEngine}
+
+class _EngineStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = {}
+
+    def record(self, engine, seconds):
+        with self._lock:
+            n, total = self.calls.get(engine, (0, 0.0))
+            self.calls[engine] = (n + 1, total + seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {e: {"calls": n, "avg_ms": round(total / n * 1000, 2)} for e, (n, total) in self.calls.items() if n}
+
+_engine = None
+_engine_lock = threading.Lock()
+_stats = _EngineStats()
+
+def create_engine(name="auto", pool_size=None):
+    """`auto` prefers the tesserocr handle pool and falls back to pytesseract when tesserocr is not installed."""
+    if name not in ("auto", *ENGINES):
+        raise ValueError(f"Unknown OCR engine: {name} (expected auto, {', '.join(ENGINES)})")
+    if name in ("auto", "tesserocr"):
+        try:
+            return TesserocrEngine(pool_size)
+        except ImportError:
+            if name == "tesserocr": print("⚠️ tesserocr is not installed; falling back to pytesseract.")
+    return PytesseractEngine()
+
+def set_engine(name="auto", pool_size=None):
+    """Selects the engine used by get_ocr in this process."""
+    global _engine
+    with _engine_lock:
+        _engine = create_engine(name, pool_size)
+    return _engine
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None: _engine = create_engine(os.getenv("OCR_ENGINE", "auto"))
+    return _engine
+
+def engine_stats():
+    """Calls and mean latency per engine in this process, e.g. for /stats."""
+    return _stats.snapshot()
+
+def measure_overhead(engine, repeat=5, lang="eng", config=OCR_CONFIG):
+    """Median ms of OCR on a blank 32x32 page: what an engine costs per call before it reads any text."""
+    blank = Image.new("RGB", (32, 32), (255, 255, 255))
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        engine.tsv(blank, lang, config)
+        times.append((time.perf_counter() - start) * 1000)
+    return float(np.median(times))
+
+def get_ocr(image, lang="eng", config=OCR_CONFIG, engine=None):
+    """
+    Runs Tesseract on a PIL image and returns (words, boxes) where boxes is an (N, 4) int16 array
+    normalized to 0-1000. Pages without text yield a single full-page "empty" token.
+    """
+    engine = engine or get_engine()
+    w, h = image.size
+    start = time.perf_counter()
+    tsv = engine.tsv(image, lang, config)
+    _stats.record(engine.name, time.perf_counter() - start)
+    words, xywh = parse_tsv(tsv)
+    if not words: return ["empty"], EMPTY_BOX.copy()
+    return words, normalize_boxes(xywh, w, h)
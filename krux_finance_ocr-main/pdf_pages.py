@@ -0,0 +1,62 @@
+import os
+import tempfile
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+PDF_DPI = 200
+# Large PDFs are written once to a RAM-backed tmpfs (when available) and streamed from there
+SPILL_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+# Every function below accepts a PDF `source` that is either raw bytes or a file path.
+def _is_bytes(source):
+    return isinstance(source, (bytes, bytearray))
+
+# pdf2image is imported on first use to keep it off the API's startup path
+def count_pages(source):
+    from pdf2image import pdfinfo_from_bytes, pdfinfo_from_path
+    info = pdfinfo_from_bytes(source) if _is_bytes(source) else pdfinfo_from_path(source)
+    return int(info["Pages"])
+
+def render_page(source, page, dpi=PDF_DPI):
+    from pdf2image import convert_from_bytes, convert_from_path
+    convert = convert_from_bytes if _is_bytes(source) else convert_from_path
+    images = convert(source, dpi=dpi, first_page=page, last_page=page)
+    return images[0].convert("RGB") if images else None
+
+@contextmanager
+def open_pdf(data, spill_bytes, spill_dir=SPILL_DIR):
+    """
+    Yields a source for the functions above. PDFs up to `spill_bytes` are rendered straight from
+    memory; larger ones are written once to a uniquely named file in `spill_dir` so pdf2image does
+    not copy the whole document to disk again for every page it renders.
+    """
+    if len(data) <= spill_bytes:
+        yield data
+        return
+    fd, path = tempfile.mkstemp(prefix="krux_", suffix=".pdf", dir=spill_dir)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        yield path
+    finally:
+        os.remove(path)
+
+def iter_pages(source, dpi=PDF_DPI, max_pages=None, page_count=None):
+    """
+    Yields (page_number, image) one page at a time so memory stays bounded on long PDFs.
+    Page N+1 is rendered by poppler in a background thread while the caller OCRs page N.
+    Closing the generator early (e.g. after a confident match) skips the remaining pages.
+    Pass `page_count` if the caller already has it, to save a pdfinfo run.
+    """
+    n = count_pages(source) if page_count is None else page_count
+    if max_pages: n = min(n, max_pages)
+    if n < 1: return
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdf-render")
+    try:
+        pending = executor.submit(render_page, source, 1, dpi)
+        for page in range(1, n + 1):
+            img = pending.result()
+            if page < n: pending = executor.submit(render_page, source, page + 1, dpi)
+            if img is not None: yield page, img
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,30 @@
+from PIL import Image
+
+MAX_IMAGE_SIDE = 2200
+TARGET_DPI = 300
+HEADER_FRACTION = 1 / 3
+
+def normalize_image(img, max_side=MAX_IMAGE_SIDE, target_dpi=TARGET_DPI):
+    """
+    Downscales oversized scans and phone photos before OCR and returns an RGB image.
+    The scale is the tighter of `max_side` on the long edge and `target_dpi` (when the file
+    records its DPI). JPEGs are reduced in the decoder via `draft`, so a 6000px photo is never
+    decoded at full resolution. Images are never upscaled.
+    """
+    w, h = img.size
+    scale = 1.0
+    if max_side: scale = min(scale, max_side / max(w, h))
+    dpi = img.info.get("dpi")
+    if target_dpi and dpi and dpi[0] and float(dpi[0]) > target_dpi:
+        scale = min(scale, target_dpi / float(dpi[0]))
+    if scale >= 1.0:
+        return img if img.mode == "RGB" else img.convert("RGB")
+    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    if img.format == "JPEG":
+        img.draft("RGB", size)  # no-op once the image has been loaded
+    return img.convert("RGB").resize(size, Image.BILINEAR, reducing_gap=2.0)
+
+def header_band(img, fraction=HEADER_FRACTION):
+    """Top band of the page, where certificates print their title and usually the ID number."""
+    w, h = img.size
+    return img.crop((0, 0, w, max(1, int(h * fraction))))
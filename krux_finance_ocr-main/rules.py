@@ -0,0 +1,115 @@
+import re
+
+# Declarative rule table, evaluated in order against the upper-cased OCR text.
+# Each rule is (label, clauses, veto): it fires when every keyword of any one clause is present.
+# If a veto keyword is also present the text is left unclassified instead of trying later rules.
+RULES = (
+    ("COI", (("CORPORATE IDENTITY NUMBER",), ("CIN",)), ("GST",)),
+    ("GST", (("GST", "REG-06"),), ()),
+    ("UDYAM", (("UDYAM", "REGISTRATION"),), ()),
+    ("FSSAI", (("FSSAI",),), ()),
+    ("GUMASTA", (("GUMASTA",), ("FORM F", "ESTABLISHMENTS")), ()),
+    ("EKARMIKA", (("KARNATAKA", "FORM C"),), ()),
+    ("DRUG_LICENSE", (("FORM 20",), ("DRUG",)), ()),
+    ("IEC", (("IMPORTER-EXPORTER",), ("IEC",)), ()),
+    ("PTEC", (("PROFESSION TAX",), ("FORM II",)), ()),
+    ("TAN", (("TAN", "DEDUCTION"),), ()),
+    ("TRADE_LICENSE_WB", (("KOLKATA MUNICIPAL", "ENLISTMENT"),), ()),
+    ("PARTNERSHIP_DEED", (("DEED OF PARTNERSHIP",),), ()),
+)
+
+class Pattern:
+    """Returns `group` of the first match of a precompiled pattern."""
+    def __init__(self, pattern, flags=0, group=0, strip_ws=False):
+        self.regex = re.compile(pattern, flags)
+        self.group = group
+        self.strip_ws = strip_ws
+
+    def __call__(self, text):
+        m = self.regex.search(text)
+        if not m: return None
+        value = m.group(self.group)
+        return re.sub(r"\s+", "", value) if self.strip_ws else value
+
+class LabelledValue:
+    """
+    Equivalent of `re.search(label + ".*?(" + value + ")")` without the lazy-dot backtracking: the
+    value is searched once from the end of each label, within the label's line unless `dotall`.
+    A label whose search region is covered by one that already failed is skipped, so the cost is
+    linear in the text instead of quadratic in the number of labels. Label alternatives must not
+    share a prefix (the legacy regex would retry each alternative at the same position).
+    """
+    def __init__(self, label, value, flags=0, dotall=False, strip_ws=False):
+        self.label = re.compile(label, flags)
+        self.value = re.compile(value, flags)
+        self.dotall = dotall
+        self.strip_ws = strip_ws
+
+    def __call__(self, text):
+        failed_start, failed_end = -1, -1
+        m = self.label.search(text)
+        while m:
+            start = m.end()
+            if not (failed_start <= start <= failed_end):
+                end = len(text) if self.dotall else text.find("\n", start)
+                if end < 0: end = len(text)
+                v = self.value.search(text, start, end)
+                if v:
+                    return re.sub(r"\s+", "", v.group(0)) if self.strip_ws else v.group(0)
+                failed_start, failed_end = start, end
+            m = self.label.search(text, m.start() + 1)
+        return None
+
+GSTIN = r"[0-9]{2}[A-Z]{5}[0-9]{4}[A-Z]{1}[1-9A-Z]{1}Z[0-9A-Z]{1}"
+# Allow optional spaces between CIN parts to be robust to OCR tokenization
+CIN_WS = r"[LU]\s*[0-9]{5}\s*[A-Z]{2}\s*[0-9]{4}\s*[A-Z]{3}\s*[0-9]{6}"
+
+# ID extractors per class, tried in order until one returns a value
+EXTRACTORS = {
+    "GST": (
+        Pattern(rf"(?:Number|GSTIN)[\s:\-\.]*({GSTIN})", re.IGNORECASE, group=1),
+        Pattern(rf"\b{GSTIN}\b"),
+    ),
+    "COI": (
+        LabelledValue(r"CIN|Identity\s*Number", CIN_WS, re.IGNORECASE, dotall=True, strip_ws=True),
+        # Fallback: detect bare CIN even if the label wasn't OCR'ed
+        Pattern(rf"\b{CIN_WS}\b", strip_ws=True),
+    ),
+    "UDYAM": (Pattern(r"UDYAM-[A-Z]{2}-\d{2}-\d{7}", re.IGNORECASE),),
+    "FSSAI": (LabelledValue(r"Lic(?:ense)?", r"[0-9]{14}", re.IGNORECASE),),
+    "GUMASTA": (Pattern(r"(?:Registration\s*No)[\s:\-\.]*([A-Z0-9/]{5,25})", re.IGNORECASE, group=1),),
+    "IEC": (LabelledValue(r"IEC\s*Number|Code", r"[0-9]{10}", re.IGNORECASE),),
+    "TAN": (Pattern(r"[A-Z]{4}[0-9]{5}[A-Z]{1}"),),
+    "TRADE_LICENSE_WB": (LabelledValue(r"CE\s*No|Enlistment", r"[0-9]{10,15}", re.IGNORECASE),),
+}
+
+class RuleEngine:
+    """Rule-based classification and ID extraction, compiled once from RULES and EXTRACTORS."""
+    def __init__(self, rules=RULES, extractors=EXTRACTORS):
+        self.rules = rules
+        self.extractors = extractors
+
+    def classify(self, text):
+        t = text.upper()
+        # Each keyword is scanned at most once per document, and only if a rule needs it.
+        # (A single-pass multi-pattern regex measured slower than CPython's substring search.)
+        seen = {}
+        def has(keyword):
+            if keyword not in seen: seen[keyword] = keyword in t
+            return seen[keyword]
+
+        for label, clauses, veto in self.rules:
+            if any(all(has(k) for k in clause) for clause in clauses):
+                return None if any(has(k) for k in veto) else label
+        return None
+
+    def extract(self, doc_type, text):
+        data = {"type": doc_type, "id_number": "Not Found"}
+        for extractor in self.extractors.get(doc_type, ()):
+            value = extractor(text)
+            if value:
+                data["id_number"] = value
+                break
+        return data
+
+RULE_ENGINE = RuleEngine()
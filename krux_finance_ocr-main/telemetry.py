@@ -0,0 +1,70 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, multiprocess
+
+# Stage timings of the request being processed on this thread (None when nobody is collecting)
+_timings = ContextVar("krux_timings", default=None)
+
+@contextmanager
+def collect():
+    """Collects the `span` durations recorded inside the block into the yielded {stage: seconds} dict."""
+    timings = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+@contextmanager
+def span(stage):
+    """Adds the block's wall time to `stage`. Repeated stages (e.g. OCR of several PDF pages) accumulate."""
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+# Prometheus metrics, observed in the API process (worker processes return their timings instead).
+# With several server processes (uvicorn --workers / WEB_CONCURRENCY), set PROMETHEUS_MULTIPROC_DIR
+# to an empty directory shared by them: every process then writes its metrics there and /metrics
+# reports the sum over all of them instead of whichever process served the scrape.
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60)
+STAGE_SECONDS = Histogram("krux_stage_seconds", "Time spent per pipeline stage", ["stage"], buckets=BUCKETS)
+REQUEST_SECONDS = Histogram("krux_request_seconds", "End-to-end time per document", ["endpoint"], buckets=BUCKETS)
+DOCUMENTS = Counter("krux_documents_total", "Analyzed documents", ["type", "path", "status"])
+IN_FLIGHT = Gauge("krux_in_flight_documents", "Documents currently being processed", ["endpoint"], multiprocess_mode="livesum")
+
+def registry():
+    """Registry to expose on /metrics: the default one, or the aggregate of all server processes in multiprocess mode."""
+    if not MULTIPROC_DIR: return REGISTRY
+    aggregate = CollectorRegistry()
+    multiprocess.MultiProcessCollector(aggregate)
+    return aggregate
+
+def mark_process_dead():
+    """Drops this process's live gauges from the multiprocess aggregate on shutdown."""
+    if MULTIPROC_DIR: multiprocess.mark_process_dead(os.getpid())
+
+def decision_path(result):
+    """'rules', 'text' or 'model' depending on what classified the (best page of the) document, 'error' otherwise."""
+    if "Error" in result: return "error"
+    confidence = result.get("Confidence", "")
+    if "(AI)" in confidence: return "model"
+    return "text" if "(Text)" in confidence else "rules"
+
+def observe(endpoint, result, timings, elapsed):
+    """Records one finished document: its stage timings, total latency and outcome."""
+    for stage, seconds in timings.items():
+        STAGE_SECONDS.labels(stage).observe(seconds)
+    REQUEST_SECONDS.labels(endpoint).observe(elapsed)
+    DOCUMENTS.labels(result.get("Type", "none"), decision_path(result), result.get("Status", "ERROR")).inc()
+
+def as_ms(timings):
+    return {stage: round(seconds * 1000, 2) for stage, seconds in timings.items()}
@@ -0,0 +1,67 @@
+"""
+Documents that need the classifier before it has loaded must raise ModelNotReady (so the API
+answers 503 and jobs are put back in the queue) rather than come back as a document error, and
+ModelLoadFailed once loading has failed.
+PDF rendering and Tesseract are replaced by fakes so the check runs without poppler/tesseract.
+
+    python -m pytest -q tests
+"""
+import asyncio
+import numpy as np
+import pytest
+from PIL import Image
+import inference
+from jobs import JobStore, JobRunner
+from workers import ModelNotReady, ModelLoadFailed, start_loading
+
+PDF = b"%PDF-1.4 fake"
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    # One blank page with a word the rules can't classify, so the model is needed
+    monkeypatch.setattr(inference, "count_pages", lambda source: 1)
+    def iter_pages(source, max_pages=None, page_count=None):
+        yield 1, Image.new("RGB", (200, 200), "white")
+    monkeypatch.setattr(inference, "iter_pages", iter_pages)
+    monkeypatch.setattr(inference, "get_ocr", lambda img, *args, **kwargs: (["unknown"], np.array([[0, 0, 10, 10]], dtype=np.int16)))
+    return inference.DocumentAI(model_path="unused", lazy=True)
+
+def test_pdf_needing_model_raises_before_ready(pipeline, monkeypatch):
+    assert not pipeline.model_ready.is_set()
+    with pytest.raises(ModelNotReady):
+        pipeline.analyze_bytes(PDF, "scan.pdf")
+
+    monkeypatch.setattr(pipeline, "_classify", lambda img, words, boxes: ("GST", 0.5))
+    pipeline.model_ready.set()
+    result = pipeline.analyze_bytes(PDF, "scan.pdf")
+    assert result["Type"] == "GST" and result["PagesAnalyzed"] == 1
+
+def test_job_waits_for_model(pipeline, tmp_path):
+    store = JobStore(str(tmp_path), max_attempts=1)
+    job_id = store.submit(PDF, "scan.pdf")
+    runner = JobRunner(store, lambda data, name: asyncio.to_thread(pipeline.analyze_bytes, data, name),
+                       busy_errors=(ModelNotReady,), fatal_errors=(ModelLoadFailed,),
+                       ready=lambda: pipeline.model_ready.is_set() or pipeline.load_error is not None, poll_s=0)
+
+    async def process_one():
+        await runner._process(store.claim(), asyncio.Semaphore(0))
+
+    asyncio.run(process_one())
+    job = store.get(job_id)
+    # Put back without using its only attempt, and no more jobs are claimed until the model has loaded
+    assert job["status"] == "queued" and job["attempts"] == 0
+    assert runner._paused
+
+    pipeline.load_error = OSError("no such model")
+    asyncio.run(process_one())
+    job = store.get(job_id)
+    assert job["status"] == "failed" and "failed to load" in job["error"]
+
+def test_failed_load_is_terminal(pipeline, monkeypatch):
+    def load_model():
+        raise OSError("no such model")
+    monkeypatch.setattr(pipeline, "load_model", load_model)
+    start_loading(pipeline).join()
+    assert isinstance(pipeline.load_error, OSError)
+    with pytest.raises(ModelLoadFailed):
+        pipeline.analyze_bytes(PDF, "scan.pdf")
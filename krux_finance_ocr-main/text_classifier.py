@@ -0,0 +1,46 @@
+import os
+import joblib
+import numpy as np
+from sklearn.pipeline import make_pipeline
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+from sklearn.linear_model import LogisticRegression
+
+TEXT_CLF_FILE = "text_clf.joblib"
+
+class TextClassifier:
+    """
+    Text-only document classifier: hashed character n-grams (robust to OCR typos, no vocabulary to
+    store) with TF-IDF weighting and a multinomial logistic regression. It is the cheap tier between
+    the rules and LayoutLMv3 and is trained by train.py on the same OCR output.
+    """
+    def __init__(self, pipeline=None):
+        self.pipeline = pipeline or make_pipeline(
+            HashingVectorizer(analyzer="char_wb", ngram_range=(3, 5), n_features=2 ** 18, alternate_sign=False),
+            TfidfTransformer(sublinear_tf=True),
+            LogisticRegression(C=10.0, max_iter=1000),
+        )
+
+    def fit(self, texts, labels):
+        self.pipeline.fit(texts, labels)
+        return self
+
+    def predict_many(self, texts):
+        """Returns (labels, probabilities) of the most likely class of each text."""
+        probs = self.pipeline.predict_proba(texts)
+        best = probs.argmax(axis=1)
+        return self.pipeline.classes_[best], probs[np.arange(len(best)), best]
+
+    def predict(self, text):
+        labels, probs = self.predict_many([text])
+        return str(labels[0]), float(probs[0])
+
+    def save(self, model_dir):
+        path = os.path.join(model_dir, TEXT_CLF_FILE)
+        joblib.dump(self.pipeline, path)
+        return path
+
+    @classmethod
+    def load(cls, model_dir):
+        """Loads the classifier saved next to the model, or returns None if there is none."""
+        path = os.path.join(model_dir, TEXT_CLF_FILE)
+        return cls(joblib.load(path)) if os.path.exists(path) else None
@@ -1,50 +1,85 @@
 import os
 import torch
-import pytesseract
-import pandas as pd
+import numpy as np
+import argparse
 from PIL import Image
-from transformers import LayoutLMv3Processor, LayoutLMv3ForSequenceClassification, TrainingArguments, Trainer, default_data_collator
-from torch.utils.data import Dataset
+from transformers import LayoutLMv3Processor, LayoutLMv3ForSequenceClassification, TrainingArguments, Trainer
+from torch.utils.data import Dataset, DataLoader
 from sklearn.model_selection import train_test_split
 from data_generator import CLASSES
+from ocr import get_ocr
+from feature_store import FeatureStore
+from bucketing import BucketCollator, LengthBucketSampler, MAX_LENGTH
+from text_classifier import TextClassifier
 
-# Ensure Tesseract is in PATH or set it here if needed
-# pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
-
-def get_ocr(image):
-    w, h = image.size
-    # Use pytesseract to get words and bounding boxes
-    df = pytesseract.image_to_data(image, output_type=pytesseract.Output.DATAFRAME).dropna()
-    df = df[df.text.str.strip().astype(bool)]
-    words = df.text.astype(str).tolist()
-    boxes = [[max(0,min(1000,int(r['left']/w*1000))), max(0,min(1000,int(r['top']/h*1000))),
-              max(0,min(1000,int((r['left']+r['width'])/w*1000))), max(0,min(1000,int((r['top']+r['height'])/h*1000)))]
-             for _, r in df.iterrows()]
-    if not words: words, boxes = ["empty"], [[0,0,1000,1000]]
-    return words, boxes
+PROCESSOR_PATH = "microsoft/layoutlmv3-base"
+# Training has always used Tesseract's default page segmentation rather than --psm 6
+TRAIN_OCR_CONFIG = ""
 
 class DocDataset(Dataset):
-    def __init__(self, paths, labels, processor): 
+    def __init__(self, paths, labels, processor, store=None, keys=None):
         self.paths = paths
         self.labels = labels
         self.processor = processor
+        # With a FeatureStore, samples are read from its memory map instead of re-running OCR
+        self.store = store
+        self.keys = keys
 
     def __len__(self): return len(self.paths)
 
+    def lengths(self):
+        """Token count of every sample (from the feature store), or None when they are only known after OCR."""
+        return [self.store.length(k) for k in self.keys] if self.store is not None else None
+
     def __getitem__(self, i):
+        if self.store is not None:
+            enc = self.store.tensors(self.keys[i])
+            enc['labels'] = torch.tensor(self.labels[i], dtype=torch.long)
+            return enc
         img = Image.open(self.paths[i]).convert("RGB")
-        words, boxes = get_ocr(img)
-        enc = self.processor(img, words, boxes=boxes, truncation=True, padding="max_length", max_length=512, return_tensors="pt")
-        enc = {k: v.squeeze() for k, v in enc.items()}
+        words, boxes = get_ocr(img, config=TRAIN_OCR_CONFIG)
+        # Unpadded: BucketCollator pads each batch to its length bucket
+        enc = self.processor(img, words, boxes=boxes.tolist(), truncation=True, max_length=MAX_LENGTH, return_tensors="pt")
+        enc = {k: v[0] for k, v in enc.items()}
         enc['labels'] = torch.tensor(self.labels[i], dtype=torch.long)
         return enc
 
-def train():
+class BucketTrainer(Trainer):
+    """Trainer that draws each batch from a single length bucket when the sample lengths are known."""
+    def __init__(self, *args, lengths=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lengths = lengths
+
+    def get_train_dataloader(self):
+        if self.lengths is None: return super().get_train_dataloader()
+        # LengthBucketSampler yields whole batches, so it replaces both the sampler and batch_size
+        sampler = LengthBucketSampler(self.lengths, self.args.per_device_train_batch_size, seed=self.args.seed)
+        loader = DataLoader(self.train_dataset, batch_sampler=sampler, collate_fn=self.data_collator,
+                            num_workers=self.args.dataloader_num_workers, pin_memory=self.args.dataloader_pin_memory)
+        return self.accelerator.prepare(loader)
+
+def ocr_texts(paths, keys, store=None):
+    """OCR text of each image, read from the feature store when there is one."""
+    if store is not None:
+        return [" ".join(store.words(k)) for k in keys]
+    return [" ".join(get_ocr(Image.open(p).convert("RGB"), config=TRAIN_OCR_CONFIG)[0]) for p in paths]
+
+def train_text_classifier(train_f, train_l, test_f, test_l, store, keys, id2label):
+    """Fits the cheap text-only tier on the same split and OCR output as LayoutLMv3."""
+    print("🚀 Training text classifier...")
+    clf = TextClassifier().fit(ocr_texts(train_f, [keys.get(f) for f in train_f], store), [id2label[l] for l in train_l])
+    if test_f:
+        preds, probs = clf.predict_many(ocr_texts(test_f, [keys.get(f) for f in test_f], store))
+        correct = preds == np.array([id2label[l] for l in test_l])
+        print(f"✅ Text classifier held-out accuracy: {correct.mean():.2%} (mean confidence {probs.mean():.2%})")
+    return clf
+
+def train(feature_store="features_12class", workers=None, dataloader_workers=0):
     print("🚀 Preparing Data...")
     label2id = {label: i for i, label in enumerate(CLASSES)}
     id2label = {i: label for i, label in enumerate(CLASSES)}
     
-    processor = LayoutLMv3Processor.from_pretrained("microsoft/layoutlmv3-base", apply_ocr=False)
+    processor = LayoutLMv3Processor.from_pretrained(PROCESSOR_PATH, apply_ocr=False)
 
     all_files, all_labels = [], []
     for c in CLASSES:
@@ -61,12 +96,22 @@ def train():
         print("❌ No data found. Please run data_generator.py first.")
         return
 
+    store, keys = None, {}
+    if feature_store:
+        store = FeatureStore(feature_store)
+        keys = dict(zip(all_files, store.build(all_files, PROCESSOR_PATH, TRAIN_OCR_CONFIG, workers=workers)))
+        # Images that failed OCR/encoding are not in the store
+        kept = [i for i, f in enumerate(all_files) if keys[f] in store]
+        all_files, all_labels = [all_files[i] for i in kept], [all_labels[i] for i in kept]
+
     train_f, test_f, train_l, test_l = train_test_split(all_files, all_labels, test_size=0.2, random_state=42)
-    train_ds = DocDataset(train_f, train_l, processor)
-    test_ds = DocDataset(test_f, test_l, processor)
+    train_ds = DocDataset(train_f, train_l, processor, store, [keys.get(f) for f in train_f])
+    test_ds = DocDataset(test_f, test_l, processor, store, [keys.get(f) for f in test_f])
 
     print(f"✅ Data Prepared. Training on {len(train_f)} samples, Validating on {len(test_f)} samples.")
 
+    text_clf = train_text_classifier(train_f, train_l, test_f, test_l, store, keys, id2label)
+
     # Train Model
     os.environ["WANDB_DISABLED"] = "true"
     model = LayoutLMv3ForSequenceClassification.from_pretrained("microsoft/layoutlmv3-base", num_labels=len(CLASSES))
@@ -83,12 +128,13 @@ def train():
         learning_rate=5e-5, 
         remove_unused_columns=False, 
         report_to="none",
+        dataloader_num_workers=dataloader_workers,
         save_strategy="no" # Save manually at end to save space
     )
 
-    trainer = Trainer(
-        model=model, args=training_args, train_dataset=train_ds,
-        processing_class=processor, data_collator=default_data_collator
+    trainer = BucketTrainer(
+        model=model, args=training_args, train_dataset=train_ds, lengths=train_ds.lengths(),
+        processing_class=processor, data_collator=BucketCollator(processor.tokenizer.pad_token_id)
     )
 
     print("🚀 Starting Training...")
@@ -97,7 +143,13 @@ def train():
     print("💾 Saving Model...")
     model.save_pretrained("./saved_12class_model")
     processor.save_pretrained("./saved_12class_model")
+    text_clf.save("./saved_12class_model")
     print("✅ Training Complete & Model Saved.")
 
 if __name__ == "__main__":
-    train()
+    parser = argparse.ArgumentParser(description="Train the 12-class LayoutLMv3 document classifier")
+    parser.add_argument("--feature-store", default="features_12class", help="Directory of the precomputed OCR feature store ('' to OCR on the fly)")
+    parser.add_argument("--workers", type=int, default=None, help="Processes used to build the feature store (default: all cores)")
+    parser.add_argument("--dataloader-workers", type=int, default=0, help="DataLoader worker processes")
+    args = parser.parse_args()
+    train(args.feature_store, args.workers, args.dataloader_workers)
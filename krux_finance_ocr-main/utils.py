@@ -1,10 +1,12 @@
 import os
 import numpy as np
+from functools import lru_cache
 from PIL import Image, ImageFont
 
+@lru_cache(maxsize=None)
 def get_font(size, bold=False):
     """
-    Returns a TrueType font object. 
+    Returns a TrueType font object, loaded once per (size, bold).
     Attempts to load Arial (common on Windows) or falls back to default.
     """
     try:
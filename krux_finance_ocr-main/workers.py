@@ -0,0 +1,169 @@
+import os
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from telemetry import collect, span
+
+# Pipeline used by the task functions below. Thread pools share the app's instance via
+# `set_pipeline`; process pools build one per worker process in `init_process`.
+_pipeline = None
+
+class PoolFull(Exception):
+    """Raised when every worker is busy and the wait queue is full."""
+
+class ModelNotReady(Exception):
+    """Raised when a document needs the classifier before it has finished loading."""
+
+class ModelLoadFailed(Exception):
+    """Raised when a document needs the classifier and it failed to load (it is not retried)."""
+
+def set_pipeline(pipeline):
+    global _pipeline
+    _pipeline = pipeline
+
+def build_pipeline(model_path, backend="torch", pdf_max_pages=50, early_stop_conf=0.9, pdf_spill_mb=8,
+                   max_image_side=2200, header_fraction=1 / 3, text_clf_threshold=0.95, ocr_engine="auto", ocr_pool_size=None,
+                   precision="fp32", compile_model=False, torch_threads=None, torch_interop_threads=None,
+                   dynamic_padding=True, window_stride=128,
+                   batch_max_size=1, batch_max_wait_ms=10,
+                   cache_size=0, cache_dir=None, cache_disk_max_mb=512, cache_ttl_s=None, lazy=False):
+    """Creates a DocumentAI with the optional micro-batcher and result cache enabled (without its model if `lazy`)."""
+    import ocr
+    from backends import configure_threads
+    from inference import DocumentAI
+    ocr.set_engine(ocr_engine, ocr_pool_size)
+    configure_threads(torch_threads, torch_interop_threads)
+    pipeline = DocumentAI(model_path=model_path, backend=backend, pdf_max_pages=pdf_max_pages,
+                          early_stop_conf=early_stop_conf, pdf_spill_mb=pdf_spill_mb,
+                          max_image_side=max_image_side, header_fraction=header_fraction,
+                          text_clf_threshold=text_clf_threshold, precision=precision, compile_model=compile_model,
+                          threads=torch_threads, dynamic_padding=dynamic_padding, window_stride=window_stride, lazy=lazy)
+    # Coalesce concurrent model-fallback documents into a single forward pass (batch_max_size=1 disables)
+    if batch_max_size > 1:
+        pipeline.enable_batching(max_batch_size=batch_max_size, max_wait_ms=batch_max_wait_ms)
+    if cache_size > 0 or cache_dir:
+        from cache import ResultCache
+        pipeline.enable_cache(ResultCache(max_items=cache_size, disk_dir=cache_dir,
+                                          disk_max_mb=cache_disk_max_mb, ttl_s=cache_ttl_s))
+    return pipeline
+
+def cgroup_cpu_limit():
+    """CPUs allowed by the container's cgroup quota (v2 cpu.max or v1 cfs quota/period), or None if unlimited."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+    except (OSError, ValueError):
+        try:
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f: quota = f.read().strip()
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f: period = f.read().strip()
+        except OSError:
+            return None
+    if quota in ("max", "-1"): return None
+    try:
+        return max(1, int(int(quota) / int(period)))
+    except (ValueError, ZeroDivisionError):
+        return None
+
+def available_cpus():
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    limit = cgroup_cpu_limit()
+    return min(cpus, limit) if limit else cpus
+
+def threads_per_process(model_processes):
+    """Splits the CPUs this process may use evenly between the processes that each run a model."""
+    return max(1, available_cpus() // max(1, model_processes))
+
+def start_loading(pipeline, ready=None, failed=None):
+    """
+    Loads and warms up the pipeline's model in a background thread. `ready` and `failed` are optional
+    shared counters (multiprocessing.Value) incremented once the model is ready or has failed to load;
+    the error itself is kept on `pipeline.load_error`.
+    """
+    def load():
+        try:
+            pipeline.load_model()
+        except Exception as e:
+            print(f"❌ Model failed to load: {e}")
+            pipeline.load_error = e
+            if failed is not None:
+                with failed.get_lock(): failed.value += 1
+            return
+        print(f"✅ Model ready: {pipeline.loaded_model}")
+        if ready is not None:
+            with ready.get_lock(): ready.value += 1
+    thread = threading.Thread(target=load, name="krux-model-loader", daemon=True)
+    thread.start()
+    return thread
+
+def init_process(options, ready=None, failed=None):
+    pipeline = build_pipeline(**options, lazy=True)
+    set_pipeline(pipeline)
+    start_loading(pipeline, ready, failed)
+
+def analyze_upload(data, filename):
+    """
+    Analyzes uploaded bytes in memory; the filename only serves as a format hint.
+    Returns (result, {stage: seconds}) so stage timings survive the trip back from a worker process.
+    """
+    with collect() as timings, span("pipeline"):
+        result = _pipeline.analyze_bytes(data, filename)
+    return result, timings
+
+class WorkerPool:
+    """
+    Bounded executor for blocking OCR/model work. At most `size` tasks run at once and at most
+    `queue_size` more wait for a worker; anything beyond that is rejected with PoolFull so the
+    API can shed load instead of stalling the event loop.
+    """
+    def __init__(self, kind="thread", size=None, queue_size=None, initializer=None, initargs=()):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown worker pool kind: {kind}")
+        self.kind = kind
+        self.size = size or os.cpu_count() or 1
+        self.queue_size = self.size * 2 if queue_size is None else queue_size
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._rejected = 0
+        if kind == "process":
+            self._executor = ProcessPoolExecutor(max_workers=self.size, mp_context=multiprocessing.get_context("spawn"),
+                                                 initializer=initializer, initargs=initargs)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="krux-worker",
+                                                initializer=initializer, initargs=initargs)
+
+    def start(self):
+        """Spawns every worker process now (and so starts their model loads) instead of on first use."""
+        if self.kind == "process":
+            for _ in range(self.size): self._executor.submit(int)
+
+    def _acquire(self):
+        with self._lock:
+            if self._pending >= self.size + self.queue_size:
+                self._rejected += 1
+                raise PoolFull(f"All {self.size} workers busy and {self.queue_size} requests queued")
+            self._pending += 1
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, fn, *args):
+        self._acquire()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self._release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "workers": self.size,
+                "queue_size": self.queue_size,
+                "in_flight": self._pending,
+                "rejected": self._rejected,
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)